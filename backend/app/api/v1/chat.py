@@ -4,15 +4,19 @@ import json
 import logging
 import os
 import re
+import time
 import traceback
-from typing import List, Literal, Optional, Tuple, Set, Dict, Any
+from contextlib import aclosing
+from typing import AsyncIterator, List, Literal, Optional, Tuple, Set, Dict, Any
 
-import requests
 from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 
-from ...core.rag import get_rag
+from ...core.aio import get_http_client, run_blocking
+from ...core.cache import SemanticCache, TTLCache
+from ...core.metrics import CHAT_CACHE_HITS, CHAT_REQUESTS, PROVIDER_SECONDS, span, start_timings
+from ...core.rag import dedup_docs as _dedup_docs, get_rag
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s:%(message)s")
 
@@ -22,6 +26,24 @@ log.setLevel(logging.INFO)
 
 CHAT_HANDLER_VERSION = "chat-v12-hybrid-chunks-mpnet-rerank-2025-09-13"
 REFUSAL_PHRASE = "i don't know based on the provided context."
+SAFE_ANSWER = "I couldn’t find that information in the provided documents."
+_MULTI_QUERY_MMR = os.getenv("RAG_MULTI_QUERY_MMR", "0").strip().lower() in {"1", "true", "yes", "on"}
+
+# Full-response cache for grounded answers. Keys embed RAGStore.corpus_version,
+# so a reindex invalidates every entry (CHAT_CACHE_SIZE=0 disables, CHAT_CACHE_TTL in seconds).
+_response_cache = TTLCache(
+    maxsize=int(os.getenv("CHAT_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("CHAT_CACHE_TTL", "0")) or None,
+)
+_response_cache_version: Optional[int] = None
+
+# Semantic (paraphrase) layer in front of the LLM: reuses a grounded answer when the
+# new question embeds within CHAT_SEMANTIC_CACHE_THRESHOLD cosine of a cached one.
+_semantic_cache = SemanticCache(
+    maxsize=int(os.getenv("CHAT_SEMANTIC_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("CHAT_SEMANTIC_CACHE_TTL", "86400")) or None,
+    threshold=float(os.getenv("CHAT_SEMANTIC_CACHE_THRESHOLD", "0.92")),
+)
 
 
 class Msg(BaseModel):
@@ -44,6 +66,24 @@ class ChatResponse(BaseModel):
     debug_meta: Optional[Dict[str, Any]] = None  # included only if debug=true
 
 
+def _cache_text(text: str) -> str:
+    return re.sub(r"\s+", " ", (text or "")).strip().lower()
+
+
+def _response_cache_key(req: "ChatRequest", model: str, threshold: float, corpus_version: int) -> tuple:
+    history = tuple((m.role, _cache_text(m.content)) for m in (req.messages or [])[-3:])
+    return (corpus_version, _cache_text(req.message), history, model, req.top_k, threshold, req.debug)
+
+
+def _sync_response_cache(corpus_version: int) -> None:
+    # Drop entries from older corpus versions eagerly instead of waiting for LRU eviction
+    global _response_cache_version
+    if _response_cache_version != corpus_version:
+        _response_cache.clear()
+        _semantic_cache.clear()
+        _response_cache_version = corpus_version
+
+
 def _unique_snippets(snips: List[str], max_chars: int = 3500) -> List[str]:
     seen: Set[str] = set()
     out: List[str] = []
@@ -124,6 +164,13 @@ def _build_search_queries(user_message: str, history: List[Msg]) -> List[str]:
     return out
 
 
+def _hybrid_query(user_message: str, history: List[Msg]) -> str:
+    # Hybrid retrieval needs no synonym expansions (BM25 catches exact terms); keep coreference only
+    base = user_message.strip()
+    subject = _extract_subject_from_history(history)
+    return f"{base} about {subject}" if subject else base
+
+
 def build_messages(user_message: str, context_docs: List[str], history: List[Msg]) -> List[dict]:
     """
     Build prompt messages. If the user asks for a list (certifications, skills, projects, organizations),
@@ -201,7 +248,7 @@ def validate_grounding(answer: str, context_docs: List[str], min_coverage: float
     return (coverage >= min_coverage), coverage, missing
 
 
-def call_openrouter(
+async def call_openrouter(
     *,
     messages: List[dict],
     model: str,
@@ -229,12 +276,16 @@ def call_openrouter(
 
     log.info("OpenRouter call -> url=%s model=%s msgs=%d", url, model, len(messages))
     http_meta: Dict[str, Any] = {"url": url, "model": model, "payload_preview": {"messages_len": len(messages)}}
+    t0 = time.perf_counter()
     try:
-        resp = requests.post(url, headers=headers, data=json.dumps(payload), timeout=timeout)
+        resp = await get_http_client().post(url, headers=headers, content=json.dumps(payload), timeout=timeout)
+        PROVIDER_SECONDS.observe(time.perf_counter() - t0, provider="openrouter", status=resp.status_code)
         http_meta["status"] = resp.status_code
         http_meta["content_type"] = resp.headers.get("content-type", "")
+        http_meta["http_version"] = resp.http_version
         http_meta["body_preview"] = (resp.text or "")[:600]
     except Exception as e:
+        PROVIDER_SECONDS.observe(time.perf_counter() - t0, provider="openrouter", status="error")
         err = {"error": "request_error", "detail": str(e)}
         log.error("OpenRouter request failed: %s\n%s", e, traceback.format_exc())
         return None, err, http_meta
@@ -257,6 +308,78 @@ def call_openrouter(
     return content, None, http_meta
 
 
+async def stream_openrouter(
+    *,
+    messages: List[dict],
+    model: str,
+    base_url: str,
+    api_key: str,
+    site_url: str,
+    site_title: str,
+    http_meta: Dict[str, Any],
+    temperature: float = 0.2,
+    top_p: float = 0.9,
+    timeout: float = 20.0,
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Streaming variant of call_openrouter (stream=true). Yields ("delta", text) for each
+    content token and at most one ("error", dict); fills http_meta as it goes.
+    """
+    url = base_url.rstrip("/") + "/chat/completions"
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "Accept": "text/event-stream",
+        "HTTP-Referer": site_url,
+        "X-Title": site_title,
+    }
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "top_p": top_p,
+        "stream": True,
+    }
+
+    log.info("OpenRouter stream -> url=%s model=%s msgs=%d", url, model, len(messages))
+    http_meta.update({"url": url, "model": model, "stream": True, "payload_preview": {"messages_len": len(messages)}})
+    client = get_http_client()
+    t0 = time.perf_counter()
+    try:
+        async with client.stream("POST", url, headers=headers, content=json.dumps(payload), timeout=timeout) as resp:
+            http_meta["status"] = resp.status_code
+            http_meta["content_type"] = resp.headers.get("content-type", "")
+            http_meta["http_version"] = resp.http_version
+            if resp.status_code // 100 != 2:
+                body = await resp.aread()
+                http_meta["body_preview"] = body.decode("utf-8", errors="replace")[:600]
+                yield "error", {"error": f"http_{resp.status_code}"}
+                return
+            async for raw in resp.aiter_lines():
+                # SSE comments (": OPENROUTER PROCESSING") and blank keep-alives
+                if not raw or raw.startswith(":") or not raw.startswith("data:"):
+                    continue
+                data = raw[5:].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                except Exception:
+                    continue
+                if chunk.get("error"):
+                    yield "error", {"error": "stream_error", "detail": chunk["error"]}
+                    return
+                delta = ((chunk.get("choices") or [{}])[0].get("delta") or {}).get("content")
+                if delta:
+                    yield "delta", delta
+    except Exception as e:
+        log.error("OpenRouter stream failed: %s\n%s", e, traceback.format_exc())
+        yield "error", {"error": "request_error", "detail": str(e)}
+    finally:
+        # Whole stream, first byte to last token
+        PROVIDER_SECONDS.observe(time.perf_counter() - t0, provider="openrouter_stream", status=http_meta.get("status", "error"))
+
+
 def is_refusal(answer: str) -> bool:
     return answer.strip().lower() == REFUSAL_PHRASE
 
@@ -266,114 +389,160 @@ def chat_version():
     return {"version": CHAT_HANDLER_VERSION}
 
 
-@router.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
-    dbg: Dict[str, Any] = {"handler": CHAT_HANDLER_VERSION}
-
-    # Env
+def _llm_config(req: ChatRequest) -> Optional[Dict[str, str]]:
     api_key = os.getenv("OPENROUTER_API_KEY", "").strip()
     if not api_key:
-        return JSONResponse(status_code=502, content={"error": "missing_api_key", "env": "OPENROUTER_API_KEY"})
-    base_url = (os.getenv("OPENROUTER_API_BASE") or "https://openrouter.ai/api/v1").rstrip("/")
-    site_url = os.getenv("PUBLIC_SITE_URL") or os.getenv("NEXT_PUBLIC_SITE_URL") or os.getenv("SITE_URL") or "http://localhost:3000"
-    site_title = os.getenv("SITE_TITLE") or "Portfolio"
+        return None
     req_model = (req.model or "").strip()
     if req_model.lower() == "string":
         req_model = ""
-    model = req_model or os.getenv("OPENROUTER_MODEL", "openai/gpt-oss-20b:free")
-    dbg.update({"base_url": base_url, "model": model})
+    return {
+        "api_key": api_key,
+        "base_url": (os.getenv("OPENROUTER_API_BASE") or "https://openrouter.ai/api/v1").rstrip("/"),
+        "site_url": os.getenv("PUBLIC_SITE_URL") or os.getenv("NEXT_PUBLIC_SITE_URL") or os.getenv("SITE_URL") or "http://localhost:3000",
+        "site_title": os.getenv("SITE_TITLE") or "Portfolio",
+        "model": req_model or os.getenv("OPENROUTER_MODEL", "openai/gpt-oss-20b:free"),
+    }
 
-    log.info("Chat handler=%s model=%s top_k=%d debug=%s", CHAT_HANDLER_VERSION, model, req.top_k, req.debug)
 
+def _cache_lookup(req: ChatRequest, rag: Any, model: str, threshold: float) -> Tuple[Optional[ChatResponse], Dict[str, Any]]:
+    """Check the exact and semantic response caches; returns (hit, context needed by _cache_store)."""
+    history = req.messages or []
+
+    # Response cache (exact match on normalized message + last 3 turns + settings)
+    _sync_response_cache(rag.corpus_version)
+    ctx: Dict[str, Any] = {
+        "key": _response_cache_key(req, model, threshold, rag.corpus_version),
+        "scope": (rag.corpus_version, model, req.top_k, threshold, req.debug),
+        "vec": None,
+    }
+    cached: Optional[ChatResponse] = _response_cache.get(ctx["key"])
+    if cached is not None:
+        log.info("Chat response cache hit")
+        CHAT_CACHE_HITS.inc(kind="exact")
+        hit_debug = {**(cached.debug_meta or {}), "cache": {"hit": True, "kind": "exact"}} if req.debug else None
+        return ChatResponse(answer=cached.answer, context_sources=list(cached.context_sources), debug_meta=hit_debug), ctx
+
+    # Semantic cache: only for standalone questions, since history changes what a message refers to.
+    # The vector comes from the query-embedding cache and is reused by retrieval for queries[0].
+    if not history and _semantic_cache.maxsize > 0:
+        try:
+            ctx["vec"] = rag.embeddings.embed_query(req.message.strip())
+            hit = _semantic_cache.lookup(ctx["vec"], ctx["scope"])
+        except Exception:
+            log.warning("Semantic cache lookup failed\n%s", traceback.format_exc())
+            hit = None
+        if hit is not None:
+            cached, similarity, matched = hit
+            log.info("Chat semantic cache hit sim=%.3f", similarity)
+            CHAT_CACHE_HITS.inc(kind="semantic")
+            hit_debug = {
+                **(cached.debug_meta or {}),
+                "cache": {"hit": True, "kind": "semantic", "similarity": round(similarity, 4), "matched_question": matched},
+            } if req.debug else None
+            return ChatResponse(answer=cached.answer, context_sources=list(cached.context_sources), debug_meta=hit_debug), ctx
+    return None, ctx
+
+
+def _cache_store(req: ChatRequest, ctx: Dict[str, Any], resp: ChatResponse) -> None:
+    # Only grounded answers are cached; refusals and LLM errors may be transient
+    _response_cache.set(ctx["key"], resp)
+    if ctx.get("vec") is not None:
+        _semantic_cache.add(ctx["vec"], resp, ctx["scope"], label=req.message.strip()[:200])
+
+
+def _retrieve_context(rag: Any, req: ChatRequest, dbg: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+    """Run expansion + retrieval + rerank; returns (context_snippets, ctx_sources) and fills dbg["retrieval"]."""
     # RETRIEVAL: coref-aware, synonym-expanded; MMR for diversity; cross-encoder rerank
-    rag = get_rag()
     history = req.messages or []
-    queries = _build_search_queries(req.message, history)
+    hybrid = getattr(rag, "retrieval_mode", "dense") == "hybrid"
+    with span("query_expansion"):
+        queries = [_hybrid_query(req.message, history)] if hybrid else _build_search_queries(req.message, history)
     all_docs: List[Any] = []
 
     # Larger fetch_k for better recall with hybrid chunks
     FETCH_K = max(96, req.top_k * 12)
     TOP_K = min(max(8, req.top_k), 12)
 
-    for q in queries:
+    with span("retrieve"):
         try:
-            docs_q = rag.retrieve_mmr(q, k=min(TOP_K, 8), fetch_k=FETCH_K, lambda_mult=0.5)
+            # Hybrid: one dense + one BM25 search fused with RRF, instead of many expansions
+            if hybrid:
+                dedup_docs = rag.retrieve_hybrid(queries[0], k=max(2 * TOP_K, 16), fetch_k=FETCH_K)
+            # One batched embed + candidate fetch for all expansions; MMR shares one similarity matrix.
+            # RAG_MULTI_QUERY_MMR=1 picks a single diverse set against all query vectors instead.
+            elif _MULTI_QUERY_MMR:
+                dedup_docs = rag.retrieve_many(queries, k=max(2 * TOP_K, 16), fetch_k=FETCH_K, lambda_mult=0.5, multi_query=True)
+            else:
+                dedup_docs = rag.retrieve_many(queries, k=min(TOP_K, 8), fetch_k=FETCH_K, lambda_mult=0.5)
         except Exception:
-            docs_q = rag.retrieve(q, k=min(TOP_K, 8))
-        all_docs.extend(docs_q)
-
-    # Deduplicate by (source, head-80)
-    seen_keys: Set[str] = set()
-    dedup_docs: List[Any] = []
-    for d in all_docs:
-        src = str(d.metadata.get("source", ""))
-        head = (d.page_content or "")[:80]
-        key = f"{src}|{head}"
-        if key not in seen_keys:
-            seen_keys.add(key)
-            dedup_docs.append(d)
+            log.warning("batched retrieval failed; falling back to per-query retrieval\n%s", traceback.format_exc())
+            for q in queries:
+                try:
+                    docs_q = rag.retrieve_mmr(q, k=min(TOP_K, 8), fetch_k=FETCH_K, lambda_mult=0.5)
+                except Exception:
+                    docs_q = rag.retrieve(q, k=min(TOP_K, 8))
+                all_docs.extend(docs_q)
+            # Deduplicate by (source, head-80)
+            with span("dedup"):
+                dedup_docs = _dedup_docs(all_docs)
 
     # Optional rerank with cross-encoder (if available)
     rerank_query = queries[0]
-    docs_ranked = rag.rerank_cross_encoder(rerank_query, dedup_docs, top_n=max(TOP_K, 8)) or dedup_docs
+    rerank_info: Dict[str, Any] = {}
+    with span("rerank"):
+        docs_ranked = rag.rerank_cross_encoder(rerank_query, dedup_docs, top_n=max(TOP_K, 8), stats=rerank_info) or dedup_docs
     docs = docs_ranked[: max(6, TOP_K)]
     context_snippets = [d.page_content[:1500] for d in docs]
     ctx_sources = [str(d.metadata.get("source", "")) for d in docs]
 
     dbg["retrieval"] = {
+        "mode": "hybrid" if hybrid else "dense",
         "q_count": len(queries),
         "queries": queries,
         "docs_count": len(docs),
         "sources": list(dict.fromkeys(ctx_sources)),
         "first_snippet_head": (context_snippets[0][:200] if context_snippets else ""),
         "reranker": rag.reranker_name(),
+        "rerank": {**rerank_info, "cache": rag.rerank_cache_stats()},
     }
     log.info("Retrieved %d doc(s). Sources=%s", len(ctx_sources), dbg["retrieval"]["sources"])
+    return context_snippets, ctx_sources
 
-    # Build messages (which includes a LIST_INTENT marker)
-    messages = build_messages(req.message, context_snippets, history)
 
-    # Determine temperature: if list intent then deterministic
-    list_intent = bool(re.search(r"\b(certif|certificate|certifications|skills?|projects?|experience|organizations?)\b", req.message, flags=re.I))
-    temperature = 0.0 if list_intent else 0.2
+def _temperature_for(message: str) -> float:
+    # If list intent then deterministic
+    list_intent = bool(re.search(r"\b(certif|certificate|certifications|skills?|projects?|experience|organizations?)\b", message, flags=re.I))
+    return 0.0 if list_intent else 0.2
 
-    # LLM call (NO PROVIDER FALLBACK)
-    answer, err, http_meta = call_openrouter(
-        messages=messages,
-        model=model,
-        base_url=base_url,
-        api_key=api_key,
-        site_url=site_url,
-        site_title=site_title,
-        temperature=temperature,
-        top_p=0.9,
-    )
-    dbg["openrouter"] = http_meta
-    if err:
-        detail = {"LLMError": err}
-        if req.debug:
-            detail["debug_meta"] = dbg
-        return JSONResponse(status_code=502, content=detail)
 
+def _finalize_answer(
+    req: ChatRequest,
+    answer: str,
+    context_snippets: List[str],
+    ctx_sources: List[str],
+    threshold: float,
+    dbg: Dict[str, Any],
+    http_meta: Dict[str, Any],
+) -> Tuple[ChatResponse, Optional[str]]:
+    """Refusal check + grounding validation; returns (response, rejection reason or None)."""
     if is_refusal(answer or ""):
-        safe = "I couldn’t find that information in the provided documents."
         resp_debug = {"reason": "model_refusal", **dbg} if req.debug else None
-        return ChatResponse(answer=safe, context_sources=ctx_sources, debug_meta=resp_debug)
+        return ChatResponse(answer=SAFE_ANSWER, context_sources=ctx_sources, debug_meta=resp_debug), "model_refusal"
 
     # Grounding validation
-    threshold = req.min_grounding_coverage if (req.min_grounding_coverage is not None) else 0.20
-    grounded, coverage, missing = validate_grounding(answer or "", context_snippets, min_coverage=threshold)
+    with span("grounding", dbg.get("timings_ms")):
+        grounded, coverage, missing = validate_grounding(answer or "", context_snippets, min_coverage=threshold)
     log.info("Grounding coverage=%.2f grounded=%s missing=%s", coverage, grounded, missing)
 
     if not grounded:
-        safe = "I couldn’t find that information in the provided documents."
         resp_debug = {
             "reason": "low_coverage",
             "coverage": round(coverage, 3),
             "threshold": threshold,
             **dbg,
         } if req.debug else None
-        return ChatResponse(answer=safe, context_sources=ctx_sources, debug_meta=resp_debug)
+        return ChatResponse(answer=SAFE_ANSWER, context_sources=ctx_sources, debug_meta=resp_debug), "low_coverage"
 
     # Success — return answer and sources
     resp_debug: Optional[Dict[str, Any]] = None
@@ -383,10 +552,169 @@ def chat(req: ChatRequest):
             "missing_terms_sample": missing,
             "llm_answer_preview": (answer or "")[:300],
             "retrieval": dbg["retrieval"],
+            "timings_ms": dbg.get("timings_ms"),
             "openrouter": {
                 "status": http_meta.get("status"),
                 "content_type": http_meta.get("content_type"),
             },
         }
+    return ChatResponse(answer=(answer or ""), context_sources=ctx_sources, debug_meta=resp_debug), None
+
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat(req: ChatRequest):
+    # Stage timings (ms) for debug_meta; the same spans feed /metrics histograms
+    timings = start_timings()
+    dbg: Dict[str, Any] = {"handler": CHAT_HANDLER_VERSION, "timings_ms": timings}
+
+    # Env
+    cfg = _llm_config(req)
+    if cfg is None:
+        return JSONResponse(status_code=502, content={"error": "missing_api_key", "env": "OPENROUTER_API_KEY"})
+    model = cfg["model"]
+    dbg.update({"base_url": cfg["base_url"], "model": model})
+
+    log.info("Chat handler=%s model=%s top_k=%d debug=%s", CHAT_HANDLER_VERSION, model, req.top_k, req.debug)
+
+    rag = await run_blocking(get_rag)
+    history = req.messages or []
+    threshold = req.min_grounding_coverage if (req.min_grounding_coverage is not None) else 0.20
+
+    # Embedding, vector search and reranking are blocking; keep them off the event loop
+    with span("cache_lookup"):
+        hit, cache_ctx = await run_blocking(_cache_lookup, req, rag, model, threshold)
+    if hit is not None:
+        CHAT_REQUESTS.inc(endpoint="chat", outcome="cache_hit")
+        return hit
+
+    context_snippets, ctx_sources = await run_blocking(_retrieve_context, rag, req, dbg)
 
-    return ChatResponse(answer=(answer or ""), context_sources=ctx_sources, debug_meta=resp_debug)
\ No newline at end of file
+    # Build messages (which includes a LIST_INTENT marker)
+    with span("build_messages"):
+        messages = build_messages(req.message, context_snippets, history)
+
+    # LLM call (NO PROVIDER FALLBACK)
+    with span("llm"):
+        answer, err, http_meta = await call_openrouter(
+            messages=messages,
+            model=model,
+            base_url=cfg["base_url"],
+            api_key=cfg["api_key"],
+            site_url=cfg["site_url"],
+            site_title=cfg["site_title"],
+            temperature=_temperature_for(req.message),
+            top_p=0.9,
+        )
+    dbg["openrouter"] = http_meta
+    if err:
+        CHAT_REQUESTS.inc(endpoint="chat", outcome="llm_error")
+        detail = {"LLMError": err}
+        if req.debug:
+            detail["debug_meta"] = dbg
+        return JSONResponse(status_code=502, content=detail)
+
+    resp, rejected = _finalize_answer(req, answer or "", context_snippets, ctx_sources, threshold, dbg, http_meta)
+    CHAT_REQUESTS.inc(endpoint="chat", outcome=rejected or "answered")
+    if rejected is None:
+        _cache_store(req, cache_ctx, resp)
+    return resp
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    Same pipeline as /chat, but streams the answer as server-sent events:
+      - "token":   {"text": ...} for each LLM delta
+      - "retract": {"answer": safe_answer, "reason": ...} if the streamed answer fails
+                   the refusal/grounding checks (run once the stream ends)
+      - "error":   {"LLMError": ...} on provider failure
+      - "done":    the final ChatResponse (answer, context_sources, debug_meta)
+    """
+    timings = start_timings()
+    dbg: Dict[str, Any] = {"handler": CHAT_HANDLER_VERSION, "stream": True, "timings_ms": timings}
+
+    cfg = _llm_config(req)
+    if cfg is None:
+        return JSONResponse(status_code=502, content={"error": "missing_api_key", "env": "OPENROUTER_API_KEY"})
+    model = cfg["model"]
+    dbg.update({"base_url": cfg["base_url"], "model": model})
+
+    log.info("Chat stream handler=%s model=%s top_k=%d debug=%s", CHAT_HANDLER_VERSION, model, req.top_k, req.debug)
+
+    rag = await run_blocking(get_rag)
+    history = req.messages or []
+    threshold = req.min_grounding_coverage if (req.min_grounding_coverage is not None) else 0.20
+    sse_headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+    with span("cache_lookup"):
+        hit, cache_ctx = await run_blocking(_cache_lookup, req, rag, model, threshold)
+    if hit is not None:
+        CHAT_REQUESTS.inc(endpoint="chat_stream", outcome="cache_hit")
+
+        async def cached_events() -> AsyncIterator[str]:
+            yield _sse("token", {"text": hit.answer})
+            yield _sse("done", hit.model_dump())
+        return StreamingResponse(cached_events(), media_type="text/event-stream", headers=sse_headers)
+
+    # Retrieval runs before the response starts, so its failures still surface as plain HTTP errors
+    context_snippets, ctx_sources = await run_blocking(_retrieve_context, rag, req, dbg)
+    with span("build_messages"):
+        messages = build_messages(req.message, context_snippets, history)
+
+    async def events() -> AsyncIterator[str]:
+        http_meta: Dict[str, Any] = {}
+        parts: List[str] = []
+        t0 = time.perf_counter()
+        upstream = stream_openrouter(
+            messages=messages,
+            model=model,
+            base_url=cfg["base_url"],
+            api_key=cfg["api_key"],
+            site_url=cfg["site_url"],
+            site_title=cfg["site_title"],
+            http_meta=http_meta,
+            temperature=_temperature_for(req.message),
+            top_p=0.9,
+        )
+        # aclosing: an early return (error, client gone) closes the upstream stream and
+        # returns its pooled connection now instead of whenever the generator is collected
+        async with aclosing(upstream):
+            with span("llm", timings):
+                async for kind, payload in upstream:
+                    if kind == "delta":
+                        if not parts:
+                            timings["llm_first_token"] = round((time.perf_counter() - t0) * 1000, 2)
+                        parts.append(payload)
+                        yield _sse("token", {"text": payload})
+                    else:
+                        CHAT_REQUESTS.inc(endpoint="chat_stream", outcome="llm_error")
+                        dbg["openrouter"] = http_meta
+                        detail: Dict[str, Any] = {"LLMError": payload}
+                        if req.debug:
+                            detail["debug_meta"] = dbg
+                        yield _sse("error", detail)
+                        return
+
+        dbg["openrouter"] = http_meta
+        answer = "".join(parts)
+        if not answer:
+            CHAT_REQUESTS.inc(endpoint="chat_stream", outcome="llm_error")
+            detail = {"LLMError": {"error": "empty_content"}}
+            if req.debug:
+                detail["debug_meta"] = dbg
+            yield _sse("error", detail)
+            return
+
+        resp, rejected = _finalize_answer(req, answer, context_snippets, ctx_sources, threshold, dbg, http_meta)
+        CHAT_REQUESTS.inc(endpoint="chat_stream", outcome=rejected or "answered")
+        if rejected is not None:
+            yield _sse("retract", {"answer": resp.answer, "reason": rejected})
+        else:
+            _cache_store(req, cache_ctx, resp)
+        yield _sse("done", resp.model_dump())
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=sse_headers)
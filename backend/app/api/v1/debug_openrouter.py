@@ -3,9 +3,9 @@ from __future__ import annotations
 import json
 import os
 
-import requests
 from fastapi import APIRouter, HTTPException, Query
 
+from ...core.aio import get_http_client
 from ...core.rag import get_rag
 from .chat import build_messages  # reuse same builder
 
@@ -13,13 +13,13 @@ router = APIRouter(prefix="/api/v1/debug/openrouter", tags=["debug-openrouter"])
 
 
 @router.get("/models")
-def list_models():
+async def list_models():
     key = os.getenv("OPENROUTER_API_KEY", "")
     base = (os.getenv("OPENROUTER_API_BASE") or "https://openrouter.ai/api/v1").rstrip("/")
     if not key:
         raise HTTPException(status_code=400, detail="Missing OPENROUTER_API_KEY")
     try:
-        r = requests.get(base + "/models", headers={"Authorization": f"Bearer {key}"}, timeout=15)
+        r = await get_http_client().get(base + "/models", headers={"Authorization": f"Bearer {key}"}, timeout=15)
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"request_error: {e}")
     try:
@@ -30,7 +30,7 @@ def list_models():
 
 
 @router.post("/ping")
-def ping_model(model: str = "openai/gpt-oss-20b:free"):
+async def ping_model(model: str = "openai/gpt-oss-20b:free"):
     key = os.getenv("OPENROUTER_API_KEY", "")
     base = (os.getenv("OPENROUTER_API_BASE") or "https://openrouter.ai/api/v1").rstrip("/")
     if not key:
@@ -41,10 +41,10 @@ def ping_model(model: str = "openai/gpt-oss-20b:free"):
         "temperature": 0.0,
     }
     try:
-        r = requests.post(
+        r = await get_http_client().post(
             base + "/chat/completions",
             headers={"Authorization": f"Bearer {key}", "Content-Type": "application/json"},
-            data=json.dumps(payload),
+            content=json.dumps(payload),
             timeout=20,
         )
     except Exception as e:
@@ -56,7 +56,7 @@ def ping_model(model: str = "openai/gpt-oss-20b:free"):
         content = None
     return {
         "status": r.status_code,
-        "ok": r.ok,
+        "ok": r.is_success,
         "content_type": r.headers.get("content-type", ""),
         "content_preview": (content or (r.text or ""))[:300],
     }
@@ -3,10 +3,12 @@ from __future__ import annotations
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse
 
 from ...core.rag import get_rag
 from ...core.config import settings
+from ...core.reindex_jobs import get_reindex_jobs
 
 router = APIRouter(prefix="/api/v1/debug/rag", tags=["debug-rag"])
 
@@ -36,11 +38,49 @@ def rag_reindex(
     chunk_size: int = Query(600, ge=200, le=4000, description="Deprecated, use chunk_chars"),
     overlap: int = Query(120, ge=0, le=1000),
     chunk_chars: Optional[int] = Query(None, ge=200, le=4000),
+    full: bool = Query(False, description="Re-embed every chunk instead of an incremental update"),
+    wait: bool = Query(False, description="Block until the job finishes and return its result (old behaviour)"),
 ):
-    rag = get_rag()
+    """
+    Queue a background reindex and return its job id right away (202).
+    Poll GET /reindex/{job_id} for phase, progress and throughput.
+    """
     size = int(chunk_chars or chunk_size)
-    result = rag.reindex(settings.DOCUMENTS_PATH, chunk_chars=size, overlap=overlap)
-    return {"status": "ok", **result}
+    params = {"docs_path": settings.DOCUMENTS_PATH, "chunk_chars": size, "overlap": overlap, "full": full}
+    job, coalesced = get_reindex_jobs().submit(params)
+    if wait:
+        job.finished.wait()
+        if job.status != "succeeded":
+            raise HTTPException(status_code=500, detail=job.error or "reindex failed")
+        return {"status": "ok", "job_id": job.id, **(job.result or {})}
+    return JSONResponse(status_code=202, content={**job.to_dict(), "coalesced": coalesced})
+
+
+@router.get("/reindex")
+def rag_reindex_jobs() -> Dict[str, Any]:
+    return {"jobs": [j.to_dict() for j in get_reindex_jobs().list()]}
+
+
+@router.get("/reindex/{job_id}")
+def rag_reindex_job(job_id: str) -> Dict[str, Any]:
+    job = get_reindex_jobs().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="unknown job id")
+    return job.to_dict()
+
+
+@router.get("/importtime")
+def rag_importtime(top: int = Query(25, ge=1, le=200)) -> Dict[str, Any]:
+    """
+    Boot-time breakdown: imports app.main in a fresh interpreter under
+    `python -X importtime` and aggregates by module and package.
+    """
+    from ...importtime import profile_imports
+
+    try:
+        return profile_imports("app.main", top=top)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/search")
@@ -49,13 +89,19 @@ def rag_search(
     top_k: int = Query(8, ge=1, le=64),
     fetch_k: int = Query(64, ge=1, le=256),
     use_mmr: bool = Query(True),
+    mode: Optional[str] = Query(None, description="dense | hybrid | lexical (default: RAG_RETRIEVAL_MODE)"),
 ) -> Dict[str, Any]:
     """
     Debug endpoint: run retrieval queries and return raw chunks/snippets.
     """
     rag = get_rag()
+    mode = (mode or rag.retrieval_mode).strip().lower()
     try:
-        if use_mmr:
+        if mode == "hybrid":
+            docs = rag.retrieve_hybrid(query, k=top_k, fetch_k=fetch_k)
+        elif mode == "lexical":
+            docs = rag.lexical_search(query, k=top_k)
+        elif use_mmr:
             docs = rag.retrieve_mmr(query, k=top_k, fetch_k=fetch_k, lambda_mult=0.5)
         else:
             docs = rag.retrieve(query, k=top_k)
@@ -74,6 +120,7 @@ def rag_search(
         "top_k": top_k,
         "fetch_k": fetch_k,
         "use_mmr": use_mmr,
+        "mode": mode,
         "results": out,
         "reranker": rag.reranker_name(),
     }
\ No newline at end of file
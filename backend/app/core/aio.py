@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+import httpx
+
+T = TypeVar("T")
+
+# -------------------------------
+# Shared outbound HTTP client
+# -------------------------------
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_available() -> bool:
+    if os.getenv("OPENROUTER_HTTP2", "1").strip().lower() in {"0", "false", "off"}:
+        return False
+    try:
+        import h2  # noqa: F401  (pip install httpx[http2])
+    except Exception:
+        return False
+    return True
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Process-wide pooled AsyncClient (keep-alive, HTTP/2 when h2 is installed).
+    Created by the app lifespan; lazily created here if used outside of it.
+
+    Env:
+      - HTTP_MAX_CONNECTIONS (default 100)
+      - HTTP_MAX_KEEPALIVE (default 20)
+      - OPENROUTER_HTTP2 (default 1)
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        limits = httpx.Limits(
+            max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=30.0,
+        )
+        _client = httpx.AsyncClient(limits=limits, http2=_http2_available(), timeout=20.0)
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+# -------------------------------
+# Executor for blocking / CPU-bound work
+# -------------------------------
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    # Embedding, vector search and reranking run here so they never block the event loop
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=max(1, int(os.getenv("RAG_EXECUTOR_WORKERS", "8"))),
+            thread_name_prefix="rag-exec",
+        )
+    return _executor
+
+
+async def run_blocking(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    # Run in a copy of the caller's context so contextvars (request stage timings) follow the call
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), functools.partial(ctx.run, fn, *args, **kwargs))
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .vectorstore import top_k_indices
+
+_TOKEN = re.compile(r"\w+")
+
+# Function words that match nearly every chunk and only add noise to lexical scores
+_STOPWORDS = frozenset("""
+a an and are as at be by did do does for from had has have he her his how i in is it its me my
+of on or she so that the their them they this to was were what when where which who whom why
+will with you your about tell list give show any all
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens with accents folded ("Préparatoire" -> "preparatoire"), stopwords dropped."""
+    folded = unicodedata.normalize("NFKD", text or "")
+    folded = "".join(ch for ch in folded if not unicodedata.combining(ch)).lower()
+    return [t for t in _TOKEN.findall(folded) if t not in _STOPWORDS]
+
+
+class BM25Index:
+    """
+    In-memory Okapi BM25 over the indexed chunks. Postings are per-term arrays of
+    (chunk index, term frequency), so a query touches only the chunks sharing a
+    term with it and scores them with a few vectorized array ops.
+
+    The chunk's section title is indexed with its text (only the first chunk of a
+    section carries it in its content).
+    """
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metas: List[Dict[str, Any]] = []
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._idf: Dict[str, float] = {}
+        self._doc_len = np.zeros((0,), dtype=np.float32)
+        self._avgdl = 1.0
+
+    @classmethod
+    def build(
+        cls,
+        texts: Sequence[str],
+        metas: Sequence[Dict[str, Any]],
+        ids: Optional[Sequence[str]] = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ) -> "BM25Index":
+        index = cls(k1=k1, b=b)
+        index.texts = list(texts)
+        index.metas = [dict(m or {}) for m in metas]
+        index.ids = list(ids) if ids is not None else [str(i) for i in range(len(index.texts))]
+        docs: Dict[str, List[int]] = {}
+        freqs: Dict[str, List[int]] = {}
+        lengths: List[int] = []
+        for i, (text, meta) in enumerate(zip(index.texts, index.metas)):
+            tokens = tokenize(f"{meta.get('section', '')}\n{text}")
+            lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                docs.setdefault(term, []).append(i)
+                freqs.setdefault(term, []).append(tf)
+        n = len(index.texts)
+        index._doc_len = np.asarray(lengths, dtype=np.float32)
+        index._avgdl = float(index._doc_len.mean()) if n and index._doc_len.sum() > 0 else 1.0
+        for term, rows in docs.items():
+            index._postings[term] = (np.asarray(rows, dtype=np.int64), np.asarray(freqs[term], dtype=np.float32))
+            df = len(rows)
+            index._idf[term] = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+        return index
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def scores(self, query: str) -> np.ndarray:
+        out = np.zeros((len(self.texts),), dtype=np.float32)
+        norm = self.k1 * (1.0 - self.b + self.b * self._doc_len / self._avgdl)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            rows, tf = posting
+            out[rows] += self._idf[term] * tf * (self.k1 + 1.0) / (tf + norm[rows])
+        return out
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """(chunk index, score) of the k best-scoring chunks that share a term with the query."""
+        scores = self.scores(query)
+        hits = np.flatnonzero(scores > 0)
+        if hits.size == 0:
+            return []
+        best = hits[top_k_indices(scores[hits], k)]
+        return [(int(i), float(scores[i])) for i in best]
+
+    def document(self, i: int) -> Document:
+        return Document(page_content=self.texts[i], metadata=dict(self.metas[i]))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"chunks": len(self.texts), "terms": len(self._postings), "avg_chunk_tokens": round(self._avgdl, 1)}
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], k: int = 60) -> List[Tuple[Hashable, float]]:
+    """Fuse ranked key lists: score(key) = sum over lists of 1 / (k + rank), rank starting at 1."""
+    fused: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda kv: kv[1], reverse=True)
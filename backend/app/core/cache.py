@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Small thread-safe LRU cache with an optional per-entry TTL (seconds).
+    maxsize <= 0 disables caching (every get is a miss, set is a no-op).
+    """
+    def __init__(self, maxsize: int = 512, ttl: Optional[float] = None):
+        self.maxsize = int(maxsize)
+        self.ttl = float(ttl) if ttl else None
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            expires, value = item  # type: ignore[misc]
+            if expires and expires < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        expires = (time.monotonic() + self.ttl) if self.ttl else 0.0
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else None,
+        }
+
+
+class SemanticCache:
+    """
+    Near-duplicate cache: values are stored under an embedding vector and returned
+    for any later vector whose cosine similarity is >= threshold. Entries are only
+    compared within the same scope (e.g. model/top_k/corpus version), expire after
+    ttl seconds and are evicted least-recently-used beyond maxsize.
+    """
+    def __init__(self, maxsize: int = 256, ttl: Optional[float] = None, threshold: float = 0.92):
+        self.maxsize = int(maxsize)
+        self.ttl = float(ttl) if ttl else None
+        self.threshold = float(threshold)
+        self._lock = threading.Lock()
+        self._vecs: List[np.ndarray] = []
+        self._meta: List[Dict[str, Any]] = []  # scope, expires, last_used, value, label
+        self._matrix: Optional[np.ndarray] = None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _unit(vector: Sequence[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32).ravel()
+        n = float(np.linalg.norm(v))
+        return v / n if n > 0 else v
+
+    def _drop(self, idx: List[int]) -> None:
+        for i in sorted(idx, reverse=True):
+            del self._vecs[i]
+            del self._meta[i]
+        self._matrix = None
+
+    def lookup(self, vector: Sequence[float], scope: Hashable) -> Optional[Tuple[Any, float, str]]:
+        """Return (value, similarity, label) of the closest live entry above threshold, else None."""
+        if self.maxsize <= 0:
+            return None
+        q = self._unit(vector)
+        now = time.monotonic()
+        with self._lock:
+            expired = [i for i, m in enumerate(self._meta) if m["expires"] and m["expires"] < now]
+            if expired:
+                self._drop(expired)
+            if not self._vecs:
+                self.misses += 1
+                return None
+            if self._matrix is None:
+                self._matrix = np.vstack(self._vecs)
+            if self._matrix.shape[1] != q.shape[0]:
+                self.misses += 1
+                return None
+            sims = self._matrix @ q
+            for i, m in enumerate(self._meta):
+                if m["scope"] != scope:
+                    sims[i] = -1.0
+            best = int(np.argmax(sims))
+            sim = float(sims[best])
+            if sim < self.threshold:
+                self.misses += 1
+                return None
+            meta = self._meta[best]
+            meta["last_used"] = now
+            self.hits += 1
+            return meta["value"], sim, meta["label"]
+
+    def add(self, vector: Sequence[float], value: Any, scope: Hashable, label: str = "") -> None:
+        if self.maxsize <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._vecs.append(self._unit(vector))
+            self._meta.append({
+                "scope": scope,
+                "expires": (now + self.ttl) if self.ttl else 0.0,
+                "last_used": now,
+                "value": value,
+                "label": label,
+            })
+            self._matrix = None
+            if len(self._vecs) > self.maxsize:
+                lru = min(range(len(self._meta)), key=lambda i: self._meta[i]["last_used"])
+                self._drop([lru])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._vecs.clear()
+            self._meta.clear()
+            self._matrix = None
+
+    def __len__(self) -> int:
+        return len(self._vecs)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._vecs),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else None,
+        }
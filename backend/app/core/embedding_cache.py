@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    prefix TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    dim INTEGER NOT NULL,
+    vec BLOB NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (model, prefix, text_hash)
+);
+CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used);
+"""
+
+
+def _normalize(t: str) -> str:
+    return re.sub(r"\s+", " ", (t or "")).strip()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(_normalize(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Disk-backed (SQLite) cache of document embeddings keyed by
+    (model name, doc prefix, sha256 of the normalized text). Vectors are stored as
+    float32 blobs; rows carry a last-used timestamp and the table is pruned
+    least-recently-used once it grows past max_rows.
+
+    The connection is opened lazily per process, so the cache is safe to use
+    from forked workers.
+    """
+    def __init__(self, path: str, max_rows: int = 100_000):
+        self.path = str(Path(path).expanduser().resolve())
+        self.max_rows = max(1, int(max_rows))
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def after_fork(self) -> None:
+        # Forked worker: fresh lock, and forget (never close) the parent's SQLite connection
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def get_many(self, model: str, prefix: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        hashes = [text_hash(t) for t in texts]
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            db = self._db()
+            uniq = list(dict.fromkeys(hashes))
+            for i in range(0, len(uniq), 500):
+                part = uniq[i:i + 500]
+                marks = ",".join("?" * len(part))
+                rows = db.execute(
+                    f"SELECT text_hash, dim, vec FROM embeddings WHERE model=? AND prefix=? AND text_hash IN ({marks})",
+                    [model, prefix, *part],
+                ).fetchall()
+                for h, dim, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32, count=dim)
+            if found:
+                now = time.time()
+                db.executemany(
+                    "UPDATE embeddings SET last_used=? WHERE model=? AND prefix=? AND text_hash=?",
+                    [(now, model, prefix, h) for h in found],
+                )
+                db.commit()
+            out = [found.get(h) for h in hashes]
+            hit = sum(1 for v in out if v is not None)
+            self.hits += hit
+            self.misses += len(out) - hit
+        return out
+
+    def put_many(self, model: str, prefix: str, texts: Sequence[str], vectors: np.ndarray) -> None:
+        if not len(texts):
+            return
+        vecs = np.asarray(vectors, dtype=np.float32)
+        now = time.time()
+        rows = [
+            (model, prefix, text_hash(t), int(v.shape[0]), v.tobytes(), now)
+            for t, v in zip(texts, vecs)
+        ]
+        with self._lock:
+            db = self._db()
+            db.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, prefix, text_hash, dim, vec, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            db.commit()
+            self._prune(db)
+
+    def _prune(self, db: sqlite3.Connection) -> None:
+        count = db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count <= self.max_rows:
+            return
+        # Drop down to 90% of the cap so pruning does not run on every insert
+        excess = count - int(self.max_rows * 0.9)
+        db.execute(
+            "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (excess,),
+        )
+        db.commit()
+
+    def embed(self, model: str, prefix: str, texts: List[str], embed_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """Return embeddings for texts, calling embed_fn only for the cache misses."""
+        try:
+            cached = self.get_many(model, prefix, texts)
+        except sqlite3.Error:
+            cached = [None] * len(texts)
+        # Misses are embedded once per distinct (normalized) text
+        slots: Dict[str, List[int]] = {}
+        for i, v in enumerate(cached):
+            if v is None:
+                slots.setdefault(text_hash(texts[i]), []).append(i)
+        if slots:
+            firsts = [idx[0] for idx in slots.values()]
+            # Encode exactly the text the key was hashed from, so a vector never depends on which spelling came first
+            fresh = np.asarray(embed_fn([_normalize(texts[i]) for i in firsts]), dtype=np.float32)
+            try:
+                self.put_many(model, prefix, [texts[i] for i in firsts], fresh)
+            except sqlite3.Error:
+                pass
+            for idx, v in zip(slots.values(), fresh):
+                for i in idx:
+                    cached[i] = v
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack(cached)  # type: ignore[arg-type]
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            try:
+                rows = self._db().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            except Exception:
+                rows = None
+        return {"path": self.path, "rows": rows, "max_rows": self.max_rows, "hits": self.hits, "misses": self.misses}
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def after_fork() -> None:
+    """Re-create the process-wide cache's locks and connection in a forked worker."""
+    global _cache_lock
+    _cache_lock = threading.Lock()
+    if _cache is not None:
+        _cache.after_fork()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Process-wide cache configured from env; None when disabled.
+      - RAG_EMB_CACHE_PATH (default ./data/embedding_cache.sqlite; "off" disables)
+      - RAG_EMB_CACHE_MAX_ROWS (default 100000)
+    """
+    global _cache
+    path = os.getenv("RAG_EMB_CACHE_PATH", "./data/embedding_cache.sqlite").strip()
+    if not path or path.lower() in {"off", "none", "disabled", "0"}:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache(path, max_rows=int(os.getenv("RAG_EMB_CACHE_MAX_ROWS", "100000")))
+    return _cache
+
+
+def cached_embed_documents(model: str, prefix: str, texts: List[str], embed_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+    """
+    embed_fn(texts) through the disk cache when enabled (cache errors degrade to plain
+    misses). embed_fn always receives whitespace-normalized texts, cache or not.
+    """
+    cache = get_embedding_cache()
+    if cache is None:
+        return np.asarray(embed_fn([_normalize(t) for t in texts]), dtype=np.float32)
+    return cache.embed(model, prefix, texts, embed_fn)
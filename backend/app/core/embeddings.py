@@ -2,6 +2,10 @@ from __future__ import annotations
 
 from typing import List
 
+import numpy as np
+
+from .embedding_cache import cached_embed_documents
+
 try:
     from sentence_transformers import SentenceTransformer
 except Exception as e:
@@ -15,10 +19,14 @@ class LocalEmbeddings:
     Minimal embeddings wrapper compatible with Chroma/langchain usage.
     """
     def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+        self.model_name = model_name
         self.model = SentenceTransformer(model_name)
 
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, show_progress_bar=False, convert_to_numpy=True)
+
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        vectors = self.model.encode(texts, show_progress_bar=False, convert_to_numpy=True)
+        vectors = cached_embed_documents(self.model_name, "", texts, self._encode)
         return [v.tolist() for v in vectors]
 
     def embed_query(self, text: str) -> List[float]:
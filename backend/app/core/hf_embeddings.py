@@ -1,45 +1,113 @@
 from __future__ import annotations
 
 import os
-from typing import List, Optional, Union
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Union
 import httpx
+import numpy as np
 import re
 
-HF_API_URL_BASE = "https://api-inference.huggingface.co"
+from .embedding_cache import cached_embed_documents
+from .metrics import PROVIDER_SECONDS
+
+# Statuses _post() already waits out; batch-level retries leave them alone
+_POST_RETRY_STATUSES = (429, 503)
+
+# Overridable for self-hosted inference endpoints and local stand-ins (bench/stub_servers.py)
+HF_API_URL_BASE = (os.getenv("HF_API_URL_BASE") or "https://api-inference.huggingface.co").rstrip("/")
 
 def _normalize(t: str) -> str:
     return re.sub(r"\s+", " ", (t or "")).strip()
 
-def _mean_pool(matrix: List[List[float]]) -> List[float]:
+def _as_matrix(rows: Any) -> np.ndarray:
+    """(tokens x dim) float32 matrix; ragged rows are zero-padded/truncated to the first row's width."""
+    try:
+        arr = np.asarray(rows, dtype=np.float32)
+        if arr.ndim == 2:
+            return arr
+    except ValueError:
+        pass
+    cols = len(rows[0]) if rows and rows[0] else 0
+    out = np.zeros((len(rows), cols), dtype=np.float32)
+    for i, row in enumerate(rows):
+        if row:
+            vals = np.asarray(row[:cols], dtype=np.float32)
+            out[i, :vals.shape[0]] = vals
+    return out
+
+
+def _mean_pool(matrix: Any) -> np.ndarray:
     # Average over tokens (rows) to get a sentence embedding.
-    if not matrix:
-        return []
-    rows = len(matrix)
-    cols = len(matrix[0]) if rows else 0
-    if cols == 0:
-        return []
-    sums = [0.0] * cols
-    for row in matrix:
-        # Guard against ragged responses
-        if not row:
-            continue
-        if len(row) != cols:
-            # Truncate/extend to match first row
-            row = (row + [0.0] * cols)[:cols]
-        for j, v in enumerate(row):
-            sums[j] += float(v)
-    return [s / max(1, rows) for s in sums]
+    if matrix is None or len(matrix) == 0:
+        return np.zeros((0,), dtype=np.float32)
+    arr = _as_matrix(matrix)
+    if arr.shape[1] == 0:
+        return np.zeros((0,), dtype=np.float32)
+    return arr.mean(axis=0)
+
+
+def _l2_normalize(mat: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+def _pool_response(data: Any, n_inputs: int) -> np.ndarray:
+    """
+    Turn a feature-extraction payload into an (n_inputs x dim) float32 matrix.
+    Possible shapes:
+      - Batch -> (inputs x tokens x dim), possibly ragged in tokens
+      - Single input -> (tokens x dim)
+      - Already pooled -> (inputs x dim) or a single (dim,) vector
+    """
+    if not isinstance(data, list) or not data:
+        raise ValueError("empty or non-list response")
+    first = data[0]
+    if isinstance(first, (int, float)):
+        return np.asarray(data, dtype=np.float32)[None, :]
+    if isinstance(first, list) and first and isinstance(first[0], list):
+        try:
+            # Regular batch: one vectorized mean over the token axis
+            arr = np.asarray(data, dtype=np.float32)
+            if arr.ndim == 3:
+                return arr.mean(axis=1)
+        except ValueError:
+            pass
+        # Ragged batch (different token counts per input)
+        return np.vstack([_mean_pool(mat) for mat in data])
+    if isinstance(first, list):
+        if n_inputs > 1 and len(data) == n_inputs:
+            # Provider already pooled each input
+            return _as_matrix(data)
+        return _mean_pool(data)[None, :]
+    raise ValueError("unexpected element type")
+
 
 class HFInferenceEmbeddings:
     """
     Hugging Face Inference API embeddings wrapper (no local model load).
     Tries the unified embeddings endpoint first; on 401/403, falls back to
-    serverless feature-extraction and mean-pools token embeddings.
+    serverless feature-extraction and mean-pools token embeddings. The endpoint
+    that worked is remembered for the model, so later batches go straight to it.
+    One pooled httpx.Client is kept for the lifetime of the instance, and 503
+    "model loading" / 429 responses are retried with backoff. All retries of a
+    batch share one deadline: short for query embedding (it sits on the /chat
+    path), long for ingestion.
 
     Env:
       - HUGGINGFACE_API_KEY
       - RAG_EMBEDDING_MODEL (default: sentence-transformers/all-MiniLM-L6-v2)
       - RAG_EMB_DOC_PREFIX / RAG_EMB_QUERY_PREFIX (optional)
+      - HF_MAX_CONNECTIONS / HF_MAX_KEEPALIVE (default 10 / 5)
+      - HF_EMB_MAX_RETRIES (default 4), HF_EMB_RETRY_BACKOFF seconds (default 1.0)
+      - HF_EMB_CONCURRENCY: batch requests kept in flight (default 1 = sequential)
+      - HF_EMB_BATCH_RETRIES: extra attempts per batch on transport errors and 500/502/504 (default 2)
+      - HF_EMB_RETRY_BUDGET: seconds of retrying per document batch (default 120)
+      - HF_EMB_QUERY_RETRY_BUDGET: seconds of retrying per query batch (default 3)
+      - HF_EMB_NORMALIZE: L2-normalize output vectors (default 0)
+      - HF_API_URL_BASE (default https://api-inference.huggingface.co)
     """
     def __init__(self, model_name: Optional[str] = None, *, timeout: float = 30.0, batch_size: int = 32):
         self.token = os.getenv("HUGGINGFACE_API_KEY", "").strip()
@@ -54,6 +122,30 @@ class HFInferenceEmbeddings:
 
         self.timeout = timeout
         self.batch_size = max(1, int(batch_size))
+        self.max_retries = max(0, int(os.getenv("HF_EMB_MAX_RETRIES", "4")))
+        self.retry_backoff = float(os.getenv("HF_EMB_RETRY_BACKOFF", "1.0"))
+        self.concurrency = max(1, int(os.getenv("HF_EMB_CONCURRENCY", "1")))
+        self.batch_retries = max(0, int(os.getenv("HF_EMB_BATCH_RETRIES", "2")))
+        self.retry_budget = max(0.0, float(os.getenv("HF_EMB_RETRY_BUDGET", "120")))
+        self.query_retry_budget = max(0.0, float(os.getenv("HF_EMB_QUERY_RETRY_BUDGET", "3")))
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self.normalize = os.getenv("HF_EMB_NORMALIZE", "0").strip().lower() in {"1", "true", "yes", "on"}
+
+        # Throughput counters (cumulative); see counters_snapshot()
+        self._counters: Dict[str, float] = {"texts": 0, "batches": 0, "batch_retries": 0, "seconds": 0.0}
+        self._counters_lock = threading.Lock()
+
+        # Long-lived pooled client (one TLS handshake, reused across batches and queries)
+        self._limits = httpx.Limits(
+            max_connections=max(self.concurrency, int(os.getenv("HF_MAX_CONNECTIONS", "10"))),
+            max_keepalive_connections=int(os.getenv("HF_MAX_KEEPALIVE", "5")),
+            keepalive_expiry=60.0,
+        )
+        self._client: Optional[httpx.Client] = None
+        self._client_lock = threading.Lock()
+
+        # Sticky endpoint choice: None (unknown), "embeddings" or "feature-extraction"
+        self.endpoint: Optional[str] = None
 
         low = self.model_name.lower()
         if "e5" in low or "bge" in low:
@@ -63,6 +155,71 @@ class HFInferenceEmbeddings:
             self.doc_prefix = os.getenv("RAG_EMB_DOC_PREFIX", "")
             self.query_prefix = os.getenv("RAG_EMB_QUERY_PREFIX", "")
 
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None or self._client.is_closed:
+            with self._client_lock:
+                if self._client is None or self._client.is_closed:
+                    self._client = httpx.Client(timeout=self.timeout, limits=self._limits, headers=self._headers())
+        return self._client
+
+    def after_fork(self) -> None:
+        # Forked worker: drop (never close) the parent's sockets and pool threads; a lock
+        # held by a master thread at fork time would stay held in the child forever
+        self._client = None
+        self._pool = None
+        self._client_lock = threading.Lock()
+        self._counters_lock = threading.Lock()
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    def counters_snapshot(self) -> Dict[str, float]:
+        with self._counters_lock:
+            snap = dict(self._counters)
+        snap["texts_per_sec"] = round(snap["texts"] / snap["seconds"], 2) if snap["seconds"] else None
+        return snap
+
+    def _count(self, **delta: float) -> None:
+        with self._counters_lock:
+            for k, v in delta.items():
+                self._counters[k] = self._counters.get(k, 0) + v
+
+    def _retry_delay(self, r: httpx.Response, attempt: int) -> float:
+        # HF returns {"error": "... is currently loading", "estimated_time": 20.0} while a model warms up
+        delay = self.retry_backoff * (2 ** attempt)
+        try:
+            est = float((r.json() or {}).get("estimated_time") or 0.0)
+            if est > 0:
+                delay = max(delay, est)
+        except Exception:
+            pass
+        return min(delay, 30.0)
+
+    def _post(self, url: str, payload: Dict[str, Any], deadline: float) -> httpx.Response:
+        """POST, waiting out 429/503 until max_retries or the deadline (time.monotonic()) is reached."""
+        attempt = 0
+        while True:
+            t0 = time.perf_counter()
+            try:
+                r = self.client.post(url, json=payload)
+            except Exception:
+                PROVIDER_SECONDS.observe(time.perf_counter() - t0, provider="hf_inference", status="error")
+                raise
+            PROVIDER_SECONDS.observe(time.perf_counter() - t0, provider="hf_inference", status=r.status_code)
+            if r.status_code not in _POST_RETRY_STATUSES or attempt >= self.max_retries:
+                return r
+            delay = self._retry_delay(r, attempt)
+            if time.monotonic() + delay > deadline:
+                return r
+            time.sleep(delay)
+            attempt += 1
+
     def _headers(self) -> dict:
         return {
             "Authorization": f"Bearer {self.token}",
@@ -76,68 +233,116 @@ class HFInferenceEmbeddings:
         # Serverless pipeline endpoint
         return f"{HF_API_URL_BASE}/pipeline/feature-extraction/{self.model_name}"
 
-    def _post_embeddings(self, inputs: List[str]) -> List[List[float]]:
+    def _post_embeddings(self, inputs: List[str], deadline: float) -> np.ndarray:
         payload = {"inputs": inputs}
-        with httpx.Client(timeout=self.timeout) as client:
-            r = client.post(self._endpoint_embeddings(), headers=self._headers(), json=payload)
-            if r.status_code in (401, 403):
-                # Caller will trigger fallback
-                raise PermissionError(
-                    f"HF embeddings endpoint not permitted ({r.status_code}). "
-                    "Falling back to feature-extraction."
-                )
-            r.raise_for_status()
-            data = r.json()
+        r = self._post(self._endpoint_embeddings(), payload, deadline)
+        if r.status_code in (401, 403):
+            # Caller will trigger fallback
+            raise PermissionError(
+                f"HF embeddings endpoint not permitted ({r.status_code}). "
+                "Falling back to feature-extraction."
+            )
+        r.raise_for_status()
+        data = r.json()
         # Either {"embeddings":[...]} or list[list[float]]
         if isinstance(data, dict) and "embeddings" in data:
-            return data["embeddings"]
-        return data
+            data = data["embeddings"]
+        return np.asarray(data, dtype=np.float32).reshape(len(inputs), -1)
 
-    def _post_feature_extraction(self, inputs: List[str]) -> List[List[float]]:
+    def _post_feature_extraction(self, inputs: List[str], deadline: float) -> np.ndarray:
         # For ST models, returns per-token vectors; we mean-pool.
         payload = {"inputs": inputs, "options": {"wait_for_model": True}}
-        with httpx.Client(timeout=self.timeout) as client:
-            r = client.post(self._endpoint_feature_extraction(), headers=self._headers(), json=payload)
-            r.raise_for_status()
-            data = r.json()
-
-        # Possible shapes:
-        # - Single input -> List[List[float]] (tokens x dim)
-        # - Batch -> List[List[List[float]]]
-        # - Rarely direct List[float] if provider returns already pooled
-        if isinstance(data, list) and data and isinstance(data[0], list) and data and isinstance(data[0][0], list):
-            # Batch of matrices
-            return [_mean_pool(mat) for mat in data]  # type: ignore[arg-type]
-        if isinstance(data, list) and data and isinstance(data[0], list) and isinstance(data[0][0], (int, float)):
-            # Single matrix
-            return [_mean_pool(data)]  # type: ignore[arg-type]
-        if isinstance(data, list) and data and isinstance(data[0], (int, float)):
-            # Already a vector
-            return [list(map(float, data))]
-        # Unknown format; raise helpful error
-        raise RuntimeError(f"Unexpected HF feature-extraction response format for model '{self.model_name}'")
-
-    def _batch(self, rows: List[str], prefix: str) -> List[List[float]]:
-        out: List[List[float]] = []
-        n = len(rows)
-        i = 0
-        while i < n:
-            chunk = rows[i:i + self.batch_size]
-            prepped = [prefix + _normalize(t) for t in chunk]
+        r = self._post(self._endpoint_feature_extraction(), payload, deadline)
+        r.raise_for_status()
+        data = r.json()
+
+        try:
+            return _pool_response(data, len(inputs))
+        except ValueError:
+            # Unknown format; raise helpful error
+            raise RuntimeError(f"Unexpected HF feature-extraction response format for model '{self.model_name}'")
+
+    def _embed_batch(self, prepped: List[str], deadline: float) -> np.ndarray:
+        if self.endpoint == "feature-extraction":
+            return self._post_feature_extraction(prepped, deadline)
+        try:
+            vecs = self._post_embeddings(prepped, deadline)
+            self.endpoint = "embeddings"
+            return vecs
+        except PermissionError:
+            # Remember the fallback so later batches skip the refused endpoint
+            self.endpoint = "feature-extraction"
+            return self._post_feature_extraction(prepped, deadline)
+
+    def _embed_batch_with_retry(self, prepped: List[str], budget: float) -> np.ndarray:
+        # One deadline for this batch, shared with _post's 429/503 waits
+        deadline = time.monotonic() + budget
+        attempt = 0
+        while True:
             try:
-                vecs = self._post_embeddings(prepped)
-            except PermissionError:
-                vecs = self._post_feature_extraction(prepped)
-            out.extend(vecs)
-            i += self.batch_size
+                vecs = self._embed_batch(prepped, deadline)
+                self._count(batches=1)
+                return vecs
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                status = getattr(getattr(e, "response", None), "status_code", 0)
+                # 429/503 were already retried by _post; 4xx will not get better
+                if attempt >= self.batch_retries or (status and (status < 500 or status in _POST_RETRY_STATUSES)):
+                    raise
+                delay = self.retry_backoff * (2 ** attempt)
+                if time.monotonic() + delay > deadline:
+                    raise
+                self._count(batch_retries=1)
+                time.sleep(delay)
+                attempt += 1
+
+    def _batch(self, rows: List[str], prefix: str, budget: float) -> np.ndarray:
+        t0 = time.perf_counter()
+        chunks = [
+            [prefix + _normalize(t) for t in rows[i:i + self.batch_size]]
+            for i in range(0, len(rows), self.batch_size)
+        ]
+        if self.concurrency > 1 and len(chunks) > 1:
+            if self.endpoint is None:
+                # Resolve the working endpoint once before fanning out
+                first = [self._embed_batch_with_retry(chunks[0], budget)]
+                chunks = chunks[1:]
+            else:
+                first = []
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="hf-emb")
+            # map() yields results in input order regardless of completion order
+            results = first + list(self._pool.map(lambda c: self._embed_batch_with_retry(c, budget), chunks))
+        else:
+            results = [self._embed_batch_with_retry(c, budget) for c in chunks]
+        out = np.vstack(results) if results else np.zeros((0, 0), dtype=np.float32)
+        if self.normalize and out.size:
+            out = _l2_normalize(out)
+        self._count(texts=len(rows), seconds=time.perf_counter() - t0)
         return out
 
+    # NumPy fast path: (n x dim) float32, no per-float Python objects
+    def embed_documents_array(self, texts: List[str]) -> np.ndarray:
+        # Disk cache first; each miss would otherwise be a (rate-limited) network round trip
+        return cached_embed_documents(self.model_name, self.doc_prefix, texts, self._embed_docs_uncached)
+
+    def _embed_docs_uncached(self, texts: List[str]) -> np.ndarray:
+        return self._batch(texts, self.doc_prefix, self.retry_budget)
+
+    def embed_queries_array(self, texts: List[str]) -> np.ndarray:
+        return self._batch(texts, self.query_prefix, self.query_retry_budget)
+
     # LangChain-compatible methods
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         if not texts:
             return []
-        return self._batch(texts, self.doc_prefix)
+        return self.embed_documents_array(texts).tolist()
 
     def embed_query(self, text: str) -> List[float]:
-        vecs = self._batch([text], self.query_prefix)
-        return vecs[0] if vecs else []
\ No newline at end of file
+        vecs = self._batch([text], self.query_prefix, self.query_retry_budget)
+        return vecs[0].tolist() if len(vecs) else []
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        # Several queries in one request (batched by batch_size)
+        if not texts:
+            return []
+        return self._batch(texts, self.query_prefix, self.query_retry_budget).tolist()
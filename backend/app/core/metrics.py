@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Latency buckets (seconds): sub-ms cache hits up to slow LLM calls
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(v: float) -> str:
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.label_names, key)} {_fmt(v)}" for key, v in items]
+        return lines
+
+
+class Histogram:
+    """Prometheus-style histogram: per label set, bucket counts plus sum and count."""
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts (last slot is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][slot] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, ([*v[0]], v[1], v[2])) for k, v in self._series.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        inf = 'le="+Inf"'
+        for key, (counts, total, n) in items:
+            running = 0
+            for bound, c in zip(self.buckets, counts):
+                running += c
+                le = 'le="%s"' % _fmt(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {running}")
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, key, inf)} {n}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {total:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {n}")
+        return lines
+
+
+# Gauge-style values read at scrape time: (name, help, labels, value)
+Sample = Tuple[str, str, Dict[str, Any], float]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: List[Any] = []
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def register(self, metric: Any) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, fn: Callable[[], Iterable[Sample]]) -> None:
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines += metric.render()
+        gauges: Dict[str, Tuple[str, List[str]]] = {}
+        for fn in self._collectors:
+            try:
+                samples = list(fn())
+            except Exception:
+                continue  # a broken collector must not take /metrics down
+            for name, help_text, labels, value in samples:
+                rows = gauges.setdefault(name, (help_text, []))[1]
+                rows.append(f"{name}{_labels(list(labels), list(labels.values()))} {_fmt(value)}")
+        for name, (help_text, rows) in gauges.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", *rows]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram("rag_stage_seconds", "Time spent per pipeline stage", ["stage"]))
+EMBED_SECONDS = registry.register(Histogram("rag_embed_seconds", "Embedding calls by model and kind (query/document)", ["model", "kind"]))
+RERANK_SECONDS = registry.register(Histogram("rag_rerank_seconds", "Rerank calls: score cache lookups plus cross-encoder scoring of misses", ["model"]))
+PROVIDER_SECONDS = registry.register(Histogram("provider_request_seconds", "Outbound API calls by provider and HTTP status", ["provider", "status"]))
+CHAT_REQUESTS = registry.register(Counter("chat_requests_total", "Chat requests by endpoint and outcome", ["endpoint", "outcome"]))
+CHAT_CACHE_HITS = registry.register(Counter("chat_cache_hits_total", "Chat response cache hits by kind (exact/semantic)", ["kind"]))
+RERANK_REQUESTS = registry.register(Counter("rag_rerank_requests_total", "Rerank calls by reranker ('disabled' when off)", ["reranker"]))
+
+
+# -------------------------------
+# Spans
+# -------------------------------
+
+# Per-request stage timings (ms); run_blocking copies the context into worker threads
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("rag_stage_timings", default=None)
+
+
+def start_timings() -> Dict[str, float]:
+    """Start collecting stage timings for the current request; returns the dict spans fill."""
+    timings: Dict[str, float] = {}
+    _timings.set(timings)
+    return timings
+
+
+@contextmanager
+def span(stage: str, timings: Optional[Dict[str, float]] = None) -> Iterator[None]:
+    """
+    Time a block: observed in rag_stage_seconds{stage} and added (ms) to the
+    request's timings, given explicitly or started with start_timings().
+    """
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        STAGE_SECONDS.observe(dt, stage=stage)
+        target = timings if timings is not None else _timings.get()
+        if target is not None:
+            target[stage] = round(target.get(stage, 0.0) + dt * 1000, 2)
+
+
+def render() -> str:
+    return registry.render()
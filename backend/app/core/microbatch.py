@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+class _Pending:
+    __slots__ = ("items", "result", "error", "done")
+
+    def __init__(self, items: List[Any]):
+        self.items = items
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching across request threads. Callers submit a list of inputs
+    and block; one worker thread collects everything submitted within max_wait_ms
+    of the first request (or until max_batch inputs), runs fn once over the
+    concatenation and hands each caller its slice of the output.
+
+    Requests that arrive while a batch is running queue up and form the next
+    batch, so under load the model sees a few large forward passes instead of
+    many tiny concurrent ones. fn must return one output per input, in order.
+
+    The worker starts on first use and is re-created in a forked child.
+    """
+    def __init__(self, fn: Callable[[List[Any]], Sequence[Any]], max_batch: int = 64, max_wait_ms: float = 2.0, name: str = "microbatch"):
+        self.fn = fn
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[_Pending]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = os.getpid()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    def submit(self, items: Sequence[Any]) -> Sequence[Any]:
+        items = list(items)
+        if not items:
+            return []
+        self._ensure_worker()
+        req = _Pending(items)
+        self._queue.put(req)
+        req.done.wait()
+        if req.error is not None:
+            raise req.error
+        return req.result
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked: the parent's thread and anything queued for it do not exist here
+                self._queue = queue.Queue()
+                self._thread = None
+                self._pid = os.getpid()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _collect(self, first: _Pending) -> List[_Pending]:
+        batch = [first]
+        size = len(first.items)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                req = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(req)
+            size += len(req.items)
+        return batch
+
+    def _run(self) -> None:
+        q = self._queue
+        while True:
+            batch = self._collect(q.get())
+            flat = [x for req in batch for x in req.items]
+            try:
+                out = self.fn(flat)
+                if len(out) != len(flat):
+                    raise RuntimeError(f"{self.name}: {len(out)} outputs for {len(flat)} inputs")
+                start = 0
+                for req in batch:
+                    req.result = out[start:start + len(req.items)]
+                    start += len(req.items)
+            except BaseException as e:  # every waiting caller gets the error
+                for req in batch:
+                    req.error = e
+            finally:
+                self.batches += 1
+                self.items += len(flat)
+                self.largest_batch = max(self.largest_batch, len(flat))
+                for req in batch:
+                    req.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+
+def microbatch_enabled() -> bool:
+    return os.getenv("RAG_MICROBATCH", "1").strip().lower() not in {"0", "false", "off", "no"}
+
+
+def new_batcher(fn: Callable[[List[Any]], Sequence[Any]], name: str) -> MicroBatcher:
+    """
+    Env:
+      - RAG_MICROBATCH_MAX (inputs per forward pass, default 64)
+      - RAG_MICROBATCH_WAIT_MS (how long a batch stays open, default 2)
+    """
+    return MicroBatcher(
+        fn,
+        max_batch=int(os.getenv("RAG_MICROBATCH_MAX", "64")),
+        max_wait_ms=float(os.getenv("RAG_MICROBATCH_WAIT_MS", "2")),
+        name=name,
+    )
+
+
+class MicroBatchedQueryEmbeddings:
+    """
+    Routes query encoding of a local model through a MicroBatcher, so concurrent
+    requests share forward passes. Document embedding (indexing) goes straight to
+    the model; other attributes are proxied.
+    """
+    def __init__(self, inner: Any):
+        self.inner = inner
+        self.batcher = new_batcher(self._encode, name="query-embed-batcher")
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.inner, name)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        batched = getattr(self.inner, "embed_queries_array", None)
+        if callable(batched):
+            return np.asarray(batched(texts), dtype=np.float32)
+        return np.asarray(self.inner.embed_queries(texts), dtype=np.float32)
+
+    def embed_queries_array(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.asarray(self.batcher.submit(texts), dtype=np.float32)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return [v.tolist() for v in self.embed_queries_array(texts)]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries_array([text])[0].tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .embedding_cache import cached_embed_documents
+
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model_int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+CONFIG_FILE = "embedding_config.json"
+
+
+def _normalize(t: str) -> str:
+    return re.sub(r"\s+", " ", (t or "")).strip()
+
+
+def default_model_dir(model_name: str) -> str:
+    return str(Path("./data/onnx") / model_name.replace("/", "__"))
+
+
+class OnnxEmbeddings:
+    """
+    Sentence embeddings from a model exported by `python -m app.onnx_export`:
+    transformer forward pass in ONNX Runtime, then the same pooling/normalization
+    the SentenceTransformer pipeline applies (read from embedding_config.json).
+
+    Env:
+      - RAG_EMBEDDING_MODEL (default all-mpnet-base-v2)
+      - RAG_ONNX_MODEL_DIR (default ./data/onnx/<model>)
+      - RAG_ONNX_QUANTIZED (default 0; 1 loads the dynamic int8 model)
+      - RAG_ONNX_THREADS (intra-op threads, default: ONNX Runtime's choice)
+      - RAG_ONNX_BATCH_SIZE (default 32)
+    """
+    def __init__(self, model_name: Optional[str] = None, model_dir: Optional[str] = None, quantized: Optional[bool] = None):
+        # ONNX Runtime + HF fast tokenizers only: no torch import, a fraction of the RSS
+        try:
+            import onnxruntime as ort  # pip install onnxruntime
+            from tokenizers import Tokenizer  # pip install tokenizers
+        except Exception:
+            raise RuntimeError("onnxruntime/tokenizers not installed. pip install onnxruntime tokenizers")
+        base_name = model_name or os.getenv("RAG_EMBEDDING_MODEL", "all-mpnet-base-v2")
+        if quantized is None:
+            quantized = os.getenv("RAG_ONNX_QUANTIZED", "0").strip().lower() in {"1", "true", "yes", "on"}
+        self.model_dir = Path(model_dir or os.getenv("RAG_ONNX_MODEL_DIR") or default_model_dir(base_name))
+        model_path = self.model_dir / (QUANTIZED_MODEL_FILE if quantized else MODEL_FILE)
+        if not model_path.exists():
+            raise RuntimeError(f"ONNX model not found at {model_path}; export it with: python -m app.onnx_export --model {base_name}")
+
+        # Backend is part of the identity: chunk ids, the disk cache and query cache never mix vectors across backends
+        self.base_model_name = base_name
+        self.model_name = f"{base_name}+onnx{'-int8' if quantized else ''}"
+        self.quantized = bool(quantized)
+
+        config: Dict[str, Any] = {}
+        try:
+            config = json.loads((self.model_dir / CONFIG_FILE).read_text(encoding="utf-8"))
+        except Exception:
+            pass
+        self.pooling = str(config.get("pooling", "mean"))
+        self.normalize = bool(config.get("normalize", True))
+        self.max_length = int(config.get("max_length", 384))
+        self.batch_size = max(1, int(os.getenv("RAG_ONNX_BATCH_SIZE", "32")))
+
+        self.tokenizer = Tokenizer.from_file(str(self.model_dir / TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=self.max_length)
+        if self.tokenizer.padding is None:
+            # Default padding is [PAD]/0, but e.g. MPNet/RoBERTa vocabularies pad with <pad>/1
+            pad_token, pad_id = self._pad_token(config)
+            self.tokenizer.enable_padding(pad_id=pad_id, pad_token=pad_token)
+
+        # The session starts ORT's intra-op thread pool, which does not survive fork:
+        # it is created on first use, per process (gunicorn preloads this object in the master)
+        self._ort = ort
+        self._model_path = model_path
+        self._session: Optional[Any] = None
+        self._session_pid = 0
+        self._session_lock = threading.Lock()
+        self._input_names: set = set()
+
+        low = base_name.lower()
+        if "e5" in low or "bge" in low:
+            self.doc_prefix = os.getenv("RAG_EMB_DOC_PREFIX", "passage: ")
+            self.query_prefix = os.getenv("RAG_EMB_QUERY_PREFIX", "query: ")
+        else:
+            self.doc_prefix = os.getenv("RAG_EMB_DOC_PREFIX", "")
+            self.query_prefix = os.getenv("RAG_EMB_QUERY_PREFIX", "")
+
+    def _pad_token(self, config: Dict[str, Any]) -> Tuple[str, int]:
+        """The model's pad token: embedding_config.json, then the HF tokenizer files, then the vocabulary."""
+        token = config.get("pad_token")
+        if not token:
+            for name in ("special_tokens_map.json", "tokenizer_config.json"):
+                try:
+                    value = json.loads((self.model_dir / name).read_text(encoding="utf-8")).get("pad_token")
+                except Exception:
+                    continue
+                token = value.get("content") if isinstance(value, dict) else value
+                if token:
+                    break
+        known_id = config.get("pad_token_id")
+        for cand in [token] if token else ["[PAD]", "<pad>"]:
+            pad_id = self.tokenizer.token_to_id(cand)
+            if pad_id is not None:
+                return cand, int(known_id if known_id is not None else pad_id)
+        return str(token or "[PAD]"), int(known_id or 0)
+
+    @property
+    def session(self) -> Any:
+        pid = os.getpid()
+        if self._session is None or self._session_pid != pid:
+            with self._session_lock:
+                if self._session is None or self._session_pid != pid:
+                    ort = self._ort
+                    opts = ort.SessionOptions()
+                    threads = int(os.getenv("RAG_ONNX_THREADS", "0"))
+                    if threads > 0:
+                        opts.intra_op_num_threads = threads
+                    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                    session = ort.InferenceSession(str(self._model_path), sess_options=opts, providers=["CPUExecutionProvider"])
+                    self._input_names = {i.name for i in session.get_inputs()}
+                    self._session, self._session_pid = session, pid
+        return self._session
+
+    def after_fork(self) -> None:
+        # Forked worker: drop (never use) the parent's session and its dead thread pool
+        self._session = None
+        self._session_pid = 0
+        self._session_lock = threading.Lock()
+
+    def _forward(self, texts: List[str]) -> np.ndarray:
+        enc = self.tokenizer.encode_batch(texts)
+        ids = np.asarray([e.ids for e in enc], dtype=np.int64)
+        mask = np.asarray([e.attention_mask for e in enc], dtype=np.int64)
+        session = self.session
+        feeds = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.asarray([e.type_ids for e in enc], dtype=np.int64)
+        hidden = session.run(None, feeds)[0]  # (batch, tokens, dim)
+        if self.pooling == "cls":
+            pooled = hidden[:, 0, :]
+        else:
+            m = mask[:, :, None].astype(np.float32)
+            pooled = (hidden * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+        pooled = pooled.astype(np.float32, copy=False)
+        if self.normalize:
+            norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            pooled = pooled / norms
+        return pooled
+
+    def _encode(self, texts: List[str], prefix: str) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        prepped = [prefix + _normalize(t) for t in texts]
+        # Length-sorted batches keep padding (and wasted attention FLOPs) low
+        order = sorted(range(len(prepped)), key=lambda i: len(prepped[i]))
+        out: Optional[np.ndarray] = None
+        for start in range(0, len(order), self.batch_size):
+            idx = order[start:start + self.batch_size]
+            vecs = self._forward([prepped[i] for i in idx])
+            if out is None:
+                out = np.zeros((len(prepped), vecs.shape[1]), dtype=np.float32)
+            out[idx] = vecs
+        return out  # type: ignore[return-value]
+
+    # NumPy fast path
+    def embed_documents_array(self, texts: List[str]) -> np.ndarray:
+        return cached_embed_documents(self.model_name, self.doc_prefix, texts, self._encode_documents)
+
+    def _encode_documents(self, texts: List[str]) -> np.ndarray:
+        return self._encode(texts, self.doc_prefix)
+
+    def embed_queries_array(self, texts: List[str]) -> np.ndarray:
+        return self._encode(texts, self.query_prefix)
+
+    # LangChain interface
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return [v.tolist() for v in self.embed_documents_array(texts)]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text], self.query_prefix)[0].tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return [v.tolist() for v in self.embed_queries_array(texts)]
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import gc
+import logging
+import time
+from typing import Any, Dict
+
+log = logging.getLogger("app.rag")
+
+
+def preload_shared() -> Dict[str, Any]:
+    """
+    Build everything read-mostly before workers fork (gunicorn preload_app): the
+    embedding model, the reranker, the vector store / numpy matrix and the BM25
+    index. Workers then share these pages copy-on-write. gc.freeze() moves all
+    surviving objects to the permanent generation so worker GC passes never
+    touch (and so never copy) their pages.
+
+    No inference or Chroma query runs here: both start native thread pools (torch /
+    OpenMP, Chroma's runtime) that do not survive fork. The ONNX Runtime session,
+    which starts its pool on construction, is likewise created lazily in each
+    worker. Each worker runs the dummy query in its own lifespan warm-up instead.
+    """
+    from .rag import preload_rag
+
+    t0 = time.perf_counter()
+    rag = preload_rag()
+    rag.reranker_name()  # loads the cross-encoder
+    gc.collect()
+    gc.freeze()
+    info = {"seconds": round(time.perf_counter() - t0, 3), "load_seconds": dict(rag.load_seconds), "frozen_objects": gc.get_freeze_count()}
+    log.info("preloaded shared state: %s", info)
+    return info
+
+
+def after_fork() -> None:
+    """Run in each forked worker: re-open per-process handles of the preloaded store."""
+    from .embedding_cache import after_fork as embedding_cache_after_fork
+    from .rag import peek_rag
+
+    embedding_cache_after_fork()
+    rag = peek_rag()
+    if rag is not None:
+        rag.after_fork()
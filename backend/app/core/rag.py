@@ -1,27 +1,29 @@
 from __future__ import annotations
 
+import hashlib
+import logging
 import os
 import re
 import shutil
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Tuple, Any, Dict, Optional
-
-# Prefer modern import; fallback to community if not installed
-try:
-    from langchain_chroma import Chroma  # pip install langchain-chroma
-except Exception:
-    from langchain_community.vectorstores import Chroma  # fallback
+from typing import Callable, Iterable, Iterator, List, Tuple, Any, Dict, Optional
 
 from langchain_core.documents import Document
 
-from .config import settings
+import numpy as np
 
-# Local embeddings and optional cross-encoder reranker
-try:
-    from sentence_transformers import SentenceTransformer, CrossEncoder
-except Exception:
-    SentenceTransformer = None  # type: ignore
-    CrossEncoder = None  # type: ignore
+from .bm25 import BM25Index, reciprocal_rank_fusion
+from .cache import TTLCache
+from .config import settings
+from .embedding_cache import cached_embed_documents, get_embedding_cache
+from .metrics import EMBED_SECONDS, RERANK_REQUESTS, RERANK_SECONDS, registry as metrics_registry, span
+from .microbatch import MicroBatchedQueryEmbeddings, MicroBatcher, microbatch_enabled, new_batcher
+from .vectorstore import META_FILE, VECTORS_FILE, CandidateSet, NumpyVectorStore
 
 # Hugging Face Inference embeddings
 try:
@@ -29,6 +31,44 @@ try:
 except Exception:
     HFInferenceEmbeddings = None  # type: ignore
 
+# ONNX Runtime embeddings (exported model, optional int8)
+try:
+    from .onnx_embeddings import OnnxEmbeddings
+except Exception:
+    OnnxEmbeddings = None  # type: ignore
+
+log = logging.getLogger("app.rag")
+
+
+# Heavy dependencies (chromadb, sentence-transformers -> torch) are imported on first
+# use, so processes that never need them (HF inference, numpy backend) never pay for them
+def _chroma_cls() -> Any:
+    # Prefer modern import; fallback to community if not installed
+    try:
+        from langchain_chroma import Chroma  # pip install langchain-chroma
+    except Exception:
+        from langchain_community.vectorstores import Chroma  # fallback
+    return Chroma
+
+
+def _sentence_transformers() -> Tuple[Any, Any]:
+    """(SentenceTransformer, CrossEncoder), or (None, None) if not installed."""
+    try:
+        from sentence_transformers import SentenceTransformer, CrossEncoder
+    except Exception:
+        return None, None
+    return SentenceTransformer, CrossEncoder
+
+# Blue/green index layout under the persist dir: one v-<timestamp> directory per
+# index version plus a CURRENT file naming the live one
+INDEX_POINTER = "CURRENT"
+INDEX_VERSION_PREFIX = "v-"
+# Per-process leases on the version a process serves: <version>/.leases/<pid>
+INDEX_LEASE_DIR = ".leases"
+# What an index built before versioning left directly in persist_dir
+_LEGACY_INDEX_FILES = ("chroma.sqlite3", VECTORS_FILE, META_FILE)
+_WRITE_BATCH = 1000
+
 
 # -------------------------------
 # Hybrid chunking helpers
@@ -136,6 +176,30 @@ def _hybrid_chunk(
     return results
 
 
+def _chunk_ids(
+    pieces: List[Tuple[str, Dict[str, Any]]],
+    chunk_chars: int,
+    overlap: int,
+    model_name: str,
+    doc_prefix: str,
+) -> List[str]:
+    """
+    Stable content-hash ids: the same text, source file, chunking parameters and
+    embedding model always map to the same id, so unchanged chunks can be kept
+    across reindexes. Repeated identical chunks in one file get an occurrence suffix.
+    """
+    seen: Dict[str, int] = {}
+    ids: List[str] = []
+    for text, meta in pieces:
+        h = hashlib.sha256(
+            f"{model_name}\x1f{doc_prefix}\x1f{chunk_chars}\x1f{overlap}\x1f{meta.get('source', '')}\x1f{text}".encode("utf-8")
+        ).hexdigest()[:32]
+        n = seen.get(h, 0)
+        seen[h] = n + 1
+        ids.append(h if n == 0 else f"{h}-{n}")
+    return ids
+
+
 # -------------------------------
 # Embeddings providers
 # -------------------------------
@@ -146,6 +210,7 @@ class LocalEmbeddings:
     - E5/BGE families expect 'query: ' and 'passage: ' prefixes
     """
     def __init__(self, model_name: Optional[str] = None):
+        SentenceTransformer, _ = _sentence_transformers()
         if SentenceTransformer is None:
             raise RuntimeError("sentence-transformers not installed. pip install sentence-transformers")
         model_name = model_name or os.getenv("RAG_EMBEDDING_MODEL", "all-mpnet-base-v2")
@@ -167,67 +232,540 @@ class LocalEmbeddings:
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         if not texts:
             return []
-        prepped = [(self.doc_prefix + self._normalize(t)) for t in texts]
-        vecs = self.model.encode(prepped, show_progress_bar=False, convert_to_numpy=True)
-        return [v.tolist() for v in vecs]
+        return [v.tolist() for v in self.embed_documents_array(texts)]
 
     def embed_query(self, text: str) -> List[float]:
         prepped = self.query_prefix + self._normalize(text)
         return self.model.encode([prepped], convert_to_numpy=True)[0].tolist()
 
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        # One batched encode for several queries (e.g. /chat expansions)
+        if not texts:
+            return []
+        return [v.tolist() for v in self.embed_queries_array(texts)]
+
+    # NumPy fast path (float32 matrices, no per-float Python objects)
+    def embed_documents_array(self, texts: List[str]) -> np.ndarray:
+        # Disk cache first; only chunks never embedded with this model/prefix are encoded
+        return cached_embed_documents(self.model_name, self.doc_prefix, texts, self._encode_documents)
+
+    def _encode_documents(self, texts: List[str]) -> np.ndarray:
+        prepped = [(self.doc_prefix + self._normalize(t)) for t in texts]
+        return self.model.encode(prepped, show_progress_bar=False, convert_to_numpy=True).astype(np.float32, copy=False)
+
+    def embed_queries_array(self, texts: List[str]) -> np.ndarray:
+        prepped = [(self.query_prefix + self._normalize(t)) for t in texts]
+        return self.model.encode(prepped, show_progress_bar=False, convert_to_numpy=True).astype(np.float32, copy=False)
+
+
+def _local_embeddings() -> Any:
+    # RAG_EMBEDDING_BACKEND=onnx runs the exported model in ONNX Runtime (no torch); torch otherwise
+    backend = os.getenv("RAG_EMBEDDING_BACKEND", "torch").strip().lower()
+    if backend == "onnx":
+        if OnnxEmbeddings is None:
+            log.warning("RAG_EMBEDDING_BACKEND=onnx but onnxruntime/tokenizers are missing; using torch")
+        else:
+            try:
+                return OnnxEmbeddings()
+            except Exception as e:
+                log.warning("ONNX embeddings unavailable (%s); using torch", e)
+    return LocalEmbeddings()
+
+
+class CachedQueryEmbeddings:
+    """
+    Bounded LRU/TTL cache in front of embed_query/embed_queries of any embeddings
+    provider. Keys are (model_name, query_prefix, normalized text); document
+    embeddings pass straight through. Other attributes are proxied to the wrapped
+    provider, so model_name/doc_prefix/query_prefix still resolve.
+
+    Env:
+      - RAG_QUERY_CACHE_SIZE (default 1024; 0 disables)
+      - RAG_QUERY_CACHE_TTL seconds (default 3600; 0 = no expiry)
+    """
+    def __init__(self, inner: Any, maxsize: Optional[int] = None, ttl: Optional[float] = None):
+        self.inner = inner
+        if maxsize is None:
+            maxsize = int(os.getenv("RAG_QUERY_CACHE_SIZE", "1024"))
+        if ttl is None:
+            ttl = float(os.getenv("RAG_QUERY_CACHE_TTL", "3600"))
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._model_seen = getattr(inner, "model_name", "unknown")
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.inner, name)
+
+    def _key(self, text: str) -> Tuple[str, str, str]:
+        return (
+            getattr(self.inner, "model_name", "unknown"),
+            getattr(self.inner, "query_prefix", ""),
+            re.sub(r"\s+", " ", (text or "")).strip(),
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        vec = self.cache.get(key)
+        if vec is None:
+            vec = self.inner.embed_query(text)
+            self.cache.set(key, vec)
+        return vec
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        out: List[Optional[List[float]]] = [None] * len(texts)
+        todo: List[int] = []
+        for i, t in enumerate(texts):
+            out[i] = self.cache.get(self._key(t))
+            if out[i] is None:
+                todo.append(i)
+        if todo:
+            batched = getattr(self.inner, "embed_queries", None)
+            misses = [texts[i] for i in todo]
+            vecs = batched(misses) if callable(batched) else [self.inner.embed_query(t) for t in misses]
+            for i, v in zip(todo, vecs):
+                out[i] = v
+                self.cache.set(self._key(texts[i]), v)
+        return out  # type: ignore[return-value]
+
+    def embed_queries_array(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.embed_queries(texts), dtype=np.float32)
+
+    def sync_model(self) -> bool:
+        """Clear cached vectors if the wrapped model changed; returns True when cleared."""
+        current = getattr(self.inner, "model_name", "unknown")
+        if current == self._model_seen:
+            return False
+        self._model_seen = current
+        self.cache.clear()
+        return True
+
+
+def dedup_docs(docs: Iterable[Document]) -> List[Document]:
+    """Drop repeated chunks, keyed by (source, first 80 chars), preserving order."""
+    seen: set = set()
+    out: List[Document] = []
+    for d in docs:
+        src = str(d.metadata.get("source", ""))
+        head = (d.page_content or "")[:80]
+        key = f"{src}|{head}"
+        if key not in seen:
+            seen.add(key)
+            out.append(d)
+    return out
+
+
+# -------------------------------
+# Index versions
+# -------------------------------
+
+def new_index_dir(root: str) -> str:
+    """Create and return a fresh version directory under root."""
+    base = Path(root)
+    base.mkdir(parents=True, exist_ok=True)
+    # Names sort by creation time and are never reused: Chroma caches clients per path
+    while True:
+        ns = time.time_ns()
+        path = base / f"{INDEX_VERSION_PREFIX}{time.strftime('%Y%m%d-%H%M%S', time.gmtime(ns // 10**9))}-{ns % 10**9:09d}"
+        try:
+            path.mkdir()
+            return str(path)
+        except FileExistsError:
+            continue
+
+
+def publish_index_dir(root: str, version_dir: str) -> None:
+    """Atomically point root/CURRENT at version_dir (write tmp + rename)."""
+    tmp = Path(root) / (INDEX_POINTER + ".tmp")
+    tmp.write_text(Path(version_dir).name, encoding="utf-8")
+    os.replace(tmp, Path(root) / INDEX_POINTER)
+
+
+def _shared_system_client() -> Any:
+    try:
+        from chromadb.api.shared_system_client import SharedSystemClient
+    except Exception:
+        try:
+            from chromadb.api.client import SharedSystemClient  # older chromadb
+        except Exception:
+            return None
+    return SharedSystemClient
+
+
+def _evict_chroma_client(path: str) -> None:
+    """Stop and forget chromadb's cached client for path, closing its SQLite handles."""
+    shared = _shared_system_client()
+    systems = getattr(shared, "_identifier_to_system", None)
+    if not isinstance(systems, dict):
+        return
+    target = Path(path).resolve()
+    for ident in list(systems):
+        try:
+            if ident == "ephemeral" or Path(ident).resolve() != target:
+                continue
+        except Exception:
+            continue
+        system = systems.pop(ident, None)
+        getattr(shared, "_identifier_to_refcount", {}).pop(ident, None)
+        try:
+            if system is not None:
+                system.stop()
+        except Exception:
+            pass
+
+
+def _remove_legacy_index(root: Path) -> bool:
+    """Delete an unversioned index from root (Chroma's sqlite file and segment dirs, or numpy files)."""
+    removed = False
+    for name in _LEGACY_INDEX_FILES:
+        try:
+            (root / name).unlink()
+            removed = True
+        except FileNotFoundError:
+            pass
+    for path in root.iterdir() if root.is_dir() else []:
+        # Chroma keeps each segment in a directory named by its UUID
+        if path.is_dir() and re.fullmatch(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", path.name):
+            shutil.rmtree(path, ignore_errors=True)
+            removed = True
+    shutil.rmtree(root / INDEX_LEASE_DIR, ignore_errors=True)
+    return removed
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def take_index_lease(version_dir: Optional[str]) -> None:
+    """Mark version_dir as served by this process, so no other process garbage-collects it."""
+    if not version_dir:
+        return
+    try:
+        lease = Path(version_dir) / INDEX_LEASE_DIR / str(os.getpid())
+        lease.parent.mkdir(exist_ok=True)
+        lease.touch()
+    except OSError:
+        pass
+
+
+def drop_index_lease(version_dir: Optional[str]) -> None:
+    if not version_dir:
+        return
+    try:
+        (Path(version_dir) / INDEX_LEASE_DIR / str(os.getpid())).unlink()
+    except OSError:
+        pass
+
+
+def index_leased_elsewhere(version_dir: Path) -> bool:
+    """True if another live process holds a lease on version_dir (leases of dead pids are ignored)."""
+    try:
+        leases = list((version_dir / INDEX_LEASE_DIR).iterdir())
+    except OSError:
+        return False
+    me = os.getpid()
+    for lease in leases:
+        try:
+            pid = int(lease.name)
+        except ValueError:
+            continue
+        if pid != me and _pid_alive(pid):
+            return True
+    return False
+
 
 # -------------------------------
 # RAG store
 # -------------------------------
 
 class RAGStore:
-    def __init__(self, persist_dir: str | None = None):
+    def __init__(self, persist_dir: str | None = None, fork_safe: bool = False, embeddings: Any = None):
+        """
+        fork_safe: build for a pre-fork master (gunicorn --preload). Chroma is opened
+        but never read: a query starts its native runtime, which forked workers
+        inherit in a broken state. BM25 is then built lazily in each worker.
+
+        embeddings: use this provider instead of the configured model (benchmarks
+        and offline runs); it still gets the query cache.
+        """
         self.persist_dir = str(Path(persist_dir or settings.CHROMA_DB_PATH).expanduser().resolve())
+        # Seconds spent loading each component (reported by /readyz)
+        self.load_seconds: Dict[str, float] = {}
+        t0 = time.perf_counter()
 
-        # Prefer HF Inference when available (no local model load)
-        if HFInferenceEmbeddings and os.getenv("HUGGINGFACE_API_KEY"):
-            model_name = os.getenv("RAG_EMBEDDING_MODEL") or "sentence-transformers/all-MiniLM-L6-v2"
-            # Auto-prefix inside HFInferenceEmbeddings as well
-            self.embeddings = HFInferenceEmbeddings(model_name=model_name)
-        else:
-            self.embeddings = LocalEmbeddings()
+        if embeddings is None:
+            # Prefer HF Inference when available (no local model load)
+            if HFInferenceEmbeddings and os.getenv("HUGGINGFACE_API_KEY"):
+                model_name = os.getenv("RAG_EMBEDDING_MODEL") or "sentence-transformers/all-MiniLM-L6-v2"
+                # Auto-prefix inside HFInferenceEmbeddings as well
+                embeddings = HFInferenceEmbeddings(model_name=model_name)
+            else:
+                embeddings = _local_embeddings()
+                if microbatch_enabled():
+                    # Concurrent requests share forward passes instead of each running a tiny one
+                    embeddings = MicroBatchedQueryEmbeddings(embeddings)
+        # Query-embedding cache (fixed synonym expansions and popular questions repeat a lot)
+        self.embeddings = CachedQueryEmbeddings(embeddings)
+        self.load_seconds["embeddings"] = round(time.perf_counter() - t0, 3)
 
+        # Reindexes are serialized; the swap of the live store is atomic for readers
+        self._index_lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+        self._previous_index_dir: Optional[str] = None
+        t0 = time.perf_counter()
         self._init_vs()
+        self.load_seconds["vector_store"] = round(time.perf_counter() - t0, 3)
+        # Other processes (gunicorn workers) publish reindexes too: CURRENT is re-read at most
+        # every RAG_INDEX_POLL_SECONDS (default 1; 0 checks on every request)
+        self._pointer_poll = max(0.0, float(os.getenv("RAG_INDEX_POLL_SECONDS", "1")))
+        self._next_pointer_check = time.monotonic() + self._pointer_poll
+        if not fork_safe:
+            # A pre-fork master serves nothing; each worker takes its own lease in after_fork()
+            take_index_lease(self.index_dir)
 
         # Optional cross-encoder reranker (disable via env: RAG_RERANKER_MODEL=disabled)
         self._reranker_name = os.getenv("RAG_RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
         self._reranker: Optional[Any] = None
         self._reranker_loaded: bool = False
+        self._reranker_lock = threading.Lock()
+        # Scores for (reranker, query, chunk) pairs: popular questions rescore the same pairs
+        self._rerank_cache = TTLCache(
+            maxsize=int(os.getenv("RAG_RERANK_CACHE_SIZE", "20000")),
+            ttl=float(os.getenv("RAG_RERANK_CACHE_TTL", "0")),
+        )
+        self._rerank_batch_size = max(1, int(os.getenv("RAG_RERANK_BATCH_SIZE", "32")))
+        self._rerank_max_chars = 0
+        # Pairs from concurrent reranks are scored together (RAG_MICROBATCH=0 disables)
+        self._rerank_batcher: Optional[MicroBatcher] = (
+            new_batcher(self._predict_pairs, name="rerank-batcher") if microbatch_enabled() else None
+        )
+
+        # Thread pool for running per-query vector searches concurrently (retrieve_many)
+        self._search_workers = max(1, int(os.getenv("RAG_SEARCH_WORKERS", "4")))
+        self._search_pool: Optional[ThreadPoolExecutor] = None
+
+        # Bumped by every reindex(); response caches key on it to invalidate themselves
+        self.corpus_version: int = 0
+
+        # RAG_RETRIEVAL_MODE=hybrid fuses one dense and one BM25 search (RRF) instead of
+        # relying on many query expansions; the BM25 index is rebuilt with every index version
+        mode = os.getenv("RAG_RETRIEVAL_MODE", "dense").strip().lower()
+        self.retrieval_mode = "hybrid" if mode == "hybrid" else "dense"
+        self._rrf_k = max(1, int(os.getenv("RAG_RRF_K", "60")))
+        self.bm25: Optional[BM25Index] = None
+        if self.retrieval_mode == "hybrid" and not (fork_safe and self.vector_backend == "chroma"):
+            t0 = time.perf_counter()
+            self._ensure_bm25()
+            self.load_seconds["bm25"] = round(time.perf_counter() - t0, 3)
+
+    def _base_embeddings(self) -> Any:
+        """The model behind the query cache and micro-batching wrappers."""
+        emb = self.embeddings
+        while hasattr(emb, "inner"):
+            emb = emb.inner
+        return emb
+
+    def after_fork(self) -> None:
+        """
+        Re-create per-process resources in a forked worker (gunicorn --preload).
+        Chroma's client and SQLite handles, HTTP clients, locks and thread pools
+        are not fork-safe. Models, the BM25 index and numpy matrices are left as
+        they are, shared copy-on-write with the master (which must have been
+        built with fork_safe=True).
+        """
+        self._index_lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+        self._reranker_lock = threading.Lock()
+        self._search_pool = None
+        take_index_lease(self.index_dir)
+        reset = getattr(self._base_embeddings(), "after_fork", None)
+        if callable(reset):
+            reset()
+        if self.vector_backend == "chroma":
+            SharedSystemClient = _shared_system_client()
+            if SharedSystemClient is not None:
+                # Forget (do not stop) the master's cached clients; ours open fresh connections
+                SharedSystemClient.clear_system_cache()
+            self.vs = self._open_vs(self.index_dir)
+
+    def warm_up(self, query: str = "What projects has he worked on?") -> Dict[str, float]:
+        """
+        Load the reranker and push one query through embedding, search and rerank, so
+        lazy loads and first-call costs (allocations, thread pools, JIT/graph
+        optimizations) are paid before real traffic. Returns seconds per step.
+        """
+        t0 = time.perf_counter()
+        self._ensure_reranker()
+        self.load_seconds["reranker"] = round(time.perf_counter() - t0, 3)
+        t0 = time.perf_counter()
+        if self.retrieval_mode == "hybrid":
+            docs = self.retrieve_hybrid(query, k=8, fetch_k=32)
+        else:
+            docs = self.retrieve_many([query], k=8, fetch_k=32)
+        self.rerank_cross_encoder(query, docs, top_n=8)
+        self.load_seconds["warm_query"] = round(time.perf_counter() - t0, 3)
+        return dict(self.load_seconds)
 
     def _init_vs(self):
-        self.vs = Chroma(
-            persist_directory=self.persist_dir,
-            embedding_function=self.embeddings,
-        )
+        # RAG_VECTOR_BACKEND=numpy keeps the whole (small) corpus in one in-memory matrix
+        backend = os.getenv("RAG_VECTOR_BACKEND", "chroma").strip().lower()
+        self.vector_backend = "numpy" if backend == "numpy" else "chroma"
+        self.index_dir = self._active_index_dir()
+        self.vs = self._open_vs(self.index_dir)
+
+    def _open_vs(self, path: Optional[str]) -> Any:
+        if not path:
+            # No index yet: an empty in-memory store, so nothing is created on disk until the first reindex
+            return NumpyVectorStore(persist_directory=None, embedding_function=self.embeddings)
+        if self.vector_backend == "numpy":
+            return NumpyVectorStore(persist_directory=path, embedding_function=self.embeddings)
+        return _chroma_cls()(persist_directory=path, embedding_function=self.embeddings)
+
+    # Versioned index directories
+    def _active_index_dir(self) -> Optional[str]:
+        root = Path(self.persist_dir)
+        try:
+            name = (root / INDEX_POINTER).read_text(encoding="utf-8").strip()
+        except OSError:
+            name = ""
+        if name and (root / name).is_dir():
+            return str(root / name)
+        # An index built before versioning lives directly in persist_dir; serve it until it is garbage-collected
+        if self._has_legacy_index():
+            return str(root)
+        return None
+
+    def _has_legacy_index(self) -> bool:
+        root = Path(self.persist_dir)
+        return any((root / name).exists() for name in _LEGACY_INDEX_FILES)
+
+    def _index_versions(self) -> List[Path]:
+        root = Path(self.persist_dir)
+        if not root.is_dir():
+            return []
+        return sorted(p for p in root.glob(INDEX_VERSION_PREFIX + "*") if p.is_dir())
 
-    def _reset_vs(self):
+    def _publish(self, new_dir: str, new_vs: Any, bm25: Optional[BM25Index] = None) -> None:
+        # Pointer first, so a restart after this point opens the new version
+        publish_index_dir(self.persist_dir, new_dir)
+        self._swap_index(new_dir, new_vs, bm25)
+
+    def _swap_index(self, new_dir: str, new_vs: Any, bm25: Optional[BM25Index]) -> None:
+        take_index_lease(new_dir)
+        with self._swap_lock:
+            old_dir = self.index_dir
+            self.vs = new_vs
+            self.bm25 = bm25
+            self.index_dir = new_dir
+            self.corpus_version += 1
+        if old_dir == new_dir:
+            return
+        # The replaced version stays leased (and its client open) for requests still reading it;
+        # the one replaced before that is released now
+        retired, self._previous_index_dir = self._previous_index_dir, old_dir
+        if retired and retired not in (new_dir, old_dir):
+            drop_index_lease(retired)
+            if self.vector_backend == "chroma":
+                _evict_chroma_client(retired)
+
+    def reload_if_published(self) -> bool:
+        """
+        Switch to the version CURRENT points at if another process published one since
+        (cheap: one small file read per RAG_INDEX_POLL_SECONDS). Skipped while this
+        process is reindexing itself. BM25 is rebuilt lazily for the new version.
+        """
+        now = time.monotonic()
+        if now < self._next_pointer_check:
+            return False
+        self._next_pointer_check = now + self._pointer_poll
+        if not self._index_lock.acquire(blocking=False):
+            return False
         try:
-            if Path(self.persist_dir).exists():
-                shutil.rmtree(self.persist_dir, ignore_errors=True)
+            target = self._active_index_dir()
+            if not target or target == self.index_dir:
+                return False
+            t0 = time.perf_counter()
+            self._swap_index(target, self._open_vs(target), None)
+            log.info("switched to index %s published by another process (%.3fs)", target, time.perf_counter() - t0)
+            return True
         except Exception:
-            pass
-        self._init_vs()
+            log.warning("reopening the published index failed; keeping %s\n%s", self.index_dir, traceback.format_exc())
+            return False
+        finally:
+            self._index_lock.release()
+
+    def _gc_index_versions(self) -> List[str]:
+        """
+        Delete all but the newest RAG_INDEX_KEEP_VERSIONS (default 2) version dirs.
+        The previous version is kept by default so requests that picked up the old
+        store just before a swap finish against intact files. Versions another live
+        process still leases (a worker that has not switched yet) are never deleted;
+        a later reindex collects them. An unversioned index left in persist_dir by an
+        older release is removed the same way.
+        """
+        keep = max(1, int(os.getenv("RAG_INDEX_KEEP_VERSIONS", "2")))
+        root = Path(self.persist_dir)
+        active = Path(self.index_dir) if self.index_dir else None
+        # A pre-versioning index in persist_dir counts as the oldest version
+        versions: List[Path] = ([root] if self._has_legacy_index() else []) + self._index_versions()
+        removed: List[str] = []
+        for path in versions[:-keep]:
+            if path == active or index_leased_elsewhere(path):
+                continue
+            # chromadb caches one client per path; stop it before its files go away
+            _evict_chroma_client(str(path))
+            if path == root:
+                if _remove_legacy_index(root):
+                    removed.append(".")
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(path.name)
+        return removed
 
     def _ensure_reranker(self):
         if self._reranker_loaded:
             return
-        self._reranker_loaded = True
+        with self._reranker_lock:
+            if not self._reranker_loaded:
+                self._load_reranker()
+                self._reranker_loaded = True
+
+    def _load_reranker(self):
         name = (self._reranker_name or "").strip().lower()
         if not name or name in {"none", "disabled", "off"}:
             self._reranker = None
             return
+        _, CrossEncoder = _sentence_transformers()
         if CrossEncoder is None:
             self._reranker = None
             return
+        # Optional torch intra-op thread cap (process-wide; also applies to local embeddings)
+        threads = int(os.getenv("RAG_RERANK_THREADS", "0"))
+        if threads > 0:
+            try:
+                import torch
+                torch.set_num_threads(threads)
+            except Exception:
+                pass
         try:
-            self._reranker = CrossEncoder(self._reranker_name)
+            max_length = int(os.getenv("RAG_RERANK_MAX_LENGTH", "0"))
+            if max_length > 0:
+                self._reranker = CrossEncoder(self._reranker_name, max_length=max_length)
+            else:
+                self._reranker = CrossEncoder(self._reranker_name)
         except Exception:
             self._reranker = None
+            return
+        # Cut chunks to roughly the model's token limit (~4 chars/token) before tokenizing
+        tokens = getattr(self._reranker, "max_length", None) or 512
+        self._rerank_max_chars = int(os.getenv("RAG_RERANK_MAX_CHARS", "0")) or int(tokens) * 4
 
     def reranker_name(self) -> str:
         self._ensure_reranker()
@@ -238,94 +776,498 @@ class RAGStore:
         return self.vs.similarity_search(query, k=k)
 
     def retrieve_mmr(self, query: str, k: int = 6, fetch_k: int = 20, lambda_mult: float = 0.5) -> List[Document]:
-        # Use the sync API if available; otherwise, fall back.
-        if hasattr(self.vs, "max_marginal_relevance_search"):
+        # Our vectorized MMR when the backend can hand over candidate vectors; otherwise the store's own
+        try:
+            cands = self.fetch_candidates([query], fetch_k)
+            if cands is not None:
+                return cands.mmr(0, k, lambda_mult)
+        except Exception:
+            pass
+        vs = self.vs
+        if hasattr(vs, "max_marginal_relevance_search"):
             try:
-                return self.vs.max_marginal_relevance_search(query, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult)
+                return vs.max_marginal_relevance_search(query, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult)
             except Exception:
                 pass
-        return self.vs.similarity_search(query, k=k)
+        return vs.similarity_search(query, k=k)
+
+    @contextmanager
+    def _embed_timer(self, kind: str) -> Iterator[None]:
+        """Stage span plus the per-model embedding histogram (kind: query/document)."""
+        t0 = time.perf_counter()
+        with span(f"embed_{kind}"):
+            yield
+        EMBED_SECONDS.observe(time.perf_counter() - t0, model=getattr(self.embeddings, "model_name", "unknown"), kind=kind)
+
+    def _embed_queries(self, queries: List[str]) -> List[List[float]]:
+        with self._embed_timer("query"):
+            batched = getattr(self.embeddings, "embed_queries", None)
+            if callable(batched):
+                return batched(queries)
+            return [self.embeddings.embed_query(q) for q in queries]
+
+    def _embed_queries_array(self, queries: List[str]) -> np.ndarray:
+        fast = getattr(self.embeddings, "embed_queries_array", None)
+        if not callable(fast):
+            return np.asarray(self._embed_queries(queries), dtype=np.float32)
+        with self._embed_timer("query"):
+            return np.asarray(fast(queries), dtype=np.float32)
+
+    def _chroma_candidates(self, vs: Any, queries: np.ndarray, fetch_k: int) -> Optional[CandidateSet]:
+        coll = getattr(vs, "_collection", None)
+        if coll is None:
+            return None
+        # One batched query for all vectors, with embeddings so MMR needs no refetch
+        res = coll.query(
+            query_embeddings=queries.tolist(),
+            n_results=fetch_k,
+            include=["documents", "metadatas", "embeddings"],
+        )
+        docs: List[Document] = []
+        vecs: List[Any] = []
+        pos: Dict[str, int] = {}
+        own: List[np.ndarray] = []
+        for qi in range(len(queries)):
+            mine: List[int] = []
+            for j, cid in enumerate(res["ids"][qi]):
+                if cid not in pos:
+                    pos[cid] = len(docs)
+                    docs.append(Document(page_content=res["documents"][qi][j] or "", metadata=res["metadatas"][qi][j] or {}))
+                    vecs.append(res["embeddings"][qi][j])
+                mine.append(pos[cid])
+            own.append(np.asarray(mine, dtype=np.int64))
+        matrix = np.asarray(vecs, dtype=np.float32) if vecs else np.zeros((0, queries.shape[1]), dtype=np.float32)
+        return CandidateSet.build(docs, matrix, queries, own)
+
+    def fetch_candidates(self, queries: List[str], fetch_k: int) -> Optional[CandidateSet]:
+        """
+        Embed the queries in one batch and gather the union of their top-fetch_k
+        candidates with vectors; None if the backend cannot provide candidate vectors.
+        """
+        vectors = self._embed_queries_array(queries)
+        vs = self.vs  # one store for the whole call, even if a reindex swaps it meanwhile
+        with span("vector_search"):
+            if isinstance(vs, NumpyVectorStore):
+                return vs.candidates_by_vectors(vectors, fetch_k)
+            count = self._vector_count(vs)
+            if not count:
+                return None
+            return self._chroma_candidates(vs, vectors, min(fetch_k, count))
+
+    def _vector_count(self, vs: Any = None) -> Optional[int]:
+        vs = vs if vs is not None else self.vs
+        if isinstance(vs, NumpyVectorStore):
+            return vs.count()
+        coll = getattr(vs, "_collection", None)
+        try:
+            return coll.count() if coll is not None else None
+        except Exception:
+            return None
+
+    def _search_by_vector(self, vector: List[float], k: int, fetch_k: int, lambda_mult: float, use_mmr: bool) -> List[Document]:
+        vs = self.vs
+        if use_mmr and hasattr(vs, "max_marginal_relevance_search_by_vector"):
+            try:
+                return vs.max_marginal_relevance_search_by_vector(
+                    vector, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult
+                )
+            except Exception:
+                pass
+        return vs.similarity_search_by_vector(vector, k=k)
+
+    def retrieve_many(
+        self,
+        queries: List[str],
+        k: int = 6,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        use_mmr: bool = True,
+        multi_query: bool = False,
+    ) -> List[Document]:
+        """
+        Multi-query retrieval: embeds all queries in one batch, fetches the union of
+        their candidates (with vectors) in one search, and runs MMR per query over a
+        candidate similarity matrix computed once. Returns the merged, deduplicated
+        documents (in query order, then rank order).
+
+        multi_query=True instead selects one diverse set of k documents against the
+        union of all query vectors.
+        """
+        queries = [q for q in queries if q and q.strip()]
+        if not queries:
+            return []
+        try:
+            cands = self.fetch_candidates(queries, max(k, fetch_k))
+        except Exception:
+            cands = None
+        if cands is not None:
+            with span("mmr"):
+                if multi_query and use_mmr:
+                    results = [cands.mmr_multi(k, lambda_mult)]
+                elif use_mmr:
+                    results = [cands.mmr(qi, k, lambda_mult) for qi in range(len(queries))]
+                else:
+                    results = [cands.top(qi, k) for qi in range(len(queries))]
+            with span("dedup"):
+                return dedup_docs(d for docs in results for d in docs)
+
+        # Fallback: per-vector searches through the store's own API, run concurrently
+        vectors = self._embed_queries(queries)
+
+        def _one(vec: List[float]) -> List[Document]:
+            return self._search_by_vector(vec, k, fetch_k, lambda_mult, use_mmr)
+
+        with span("vector_search"):
+            if len(vectors) > 1 and self._search_workers > 1:
+                if self._search_pool is None:
+                    self._search_pool = ThreadPoolExecutor(
+                        max_workers=self._search_workers, thread_name_prefix="rag-search"
+                    )
+                results = list(self._search_pool.map(_one, vectors))
+            else:
+                results = [_one(v) for v in vectors]
+        with span("dedup"):
+            return dedup_docs(d for docs in results for d in docs)
+
+    # Lexical + hybrid retrieval
+    def _ensure_bm25(self) -> Optional[BM25Index]:
+        """BM25 index for the live store, built from its stored chunks on first use."""
+        index = self.bm25
+        if index is not None:
+            return index
+        vs = self.vs
+        try:
+            res = vs.get(include=["documents", "metadatas"])
+            index = BM25Index.build(
+                [t or "" for t in (res.get("documents") or [])],
+                [m or {} for m in (res.get("metadatas") or [])],
+                res.get("ids") or [],
+            )
+        except Exception:
+            log.warning("building the BM25 index failed\n%s", traceback.format_exc())
+            return None
+        with self._swap_lock:
+            if self.vs is vs:
+                self.bm25 = index
+        return index
+
+    def lexical_search(self, query: str, k: int = 20) -> List[Document]:
+        index = self._ensure_bm25()
+        if index is None:
+            return []
+        return [index.document(i) for i, _ in index.search(query, k)]
+
+    def retrieve_hybrid(self, query: str, k: int = 8, fetch_k: int = 40, lexical_query: Optional[str] = None) -> List[Document]:
+        """
+        One dense search and one BM25 search over the same chunks, fused with
+        reciprocal rank fusion (RAG_RRF_K, default 60). Exact tokens that embeddings
+        blur (acronyms like IPEIN, issuer names, credential IDs) surface through the
+        lexical side without extra query expansions.
+        """
+        dense: List[Document] = []
+        try:
+            cands = self.fetch_candidates([query], fetch_k)
+            dense = cands.top(0, fetch_k) if cands is not None else self.vs.similarity_search(query, k=fetch_k)
+        except Exception:
+            log.warning("dense search failed in hybrid retrieval\n%s", traceback.format_exc())
+        with span("bm25"):
+            lexical = self.lexical_search(lexical_query or query, fetch_k)
+
+        by_key: Dict[Tuple[str, str], Document] = {}
+        rankings: List[List[Tuple[str, str]]] = []
+        for docs in (dense, lexical):
+            keys = []
+            for d in docs:
+                key = (str(d.metadata.get("source", "")), d.page_content)
+                by_key.setdefault(key, d)
+                keys.append(key)
+            rankings.append(keys)
+        with span("fusion"):
+            fused = reciprocal_rank_fusion(rankings, k=self._rrf_k)
+            return dedup_docs(by_key[key] for key, _ in fused[:k])
 
     def retrieve_with_scores(self, query: str, k: int = 6) -> List[Tuple[Document, float | None]]:
+        vs = self.vs
         try:
-            return self.vs.similarity_search_with_relevance_scores(query, k=k)
+            return vs.similarity_search_with_relevance_scores(query, k=k)
         except Exception:
-            docs = self.vs.similarity_search(query, k=k)
+            docs = vs.similarity_search(query, k=k)
             return [(d, None) for d in docs]
 
-    def rerank_cross_encoder(self, query: str, docs: List[Document], top_n: int = 8) -> Optional[List[Document]]:
+    def rerank_cross_encoder(
+        self,
+        query: str,
+        docs: List[Document],
+        top_n: int = 8,
+        stats: Optional[Dict[str, Any]] = None,
+    ) -> Optional[List[Document]]:
+        """
+        Cross-encoder rerank. Pair scores are cached by (reranker, query hash, chunk
+        hash), so only unseen pairs reach the model, in one batched predict call.
+        If given, stats is filled with pair/cache counts and the rerank time.
+        """
         self._ensure_reranker()
-        if not self._reranker or not docs:
+        if not docs:
             return None
-        pairs = [(query, d.page_content) for d in docs]
-        try:
-            scores = self._reranker.predict(pairs)  # higher is better
-        except Exception:
+        RERANK_REQUESTS.inc(reranker=self._reranker_name if self._reranker else "disabled")
+        if not self._reranker:
             return None
-        ranked = sorted(zip(docs, scores), key=lambda x: float(x[1]), reverse=True)
-        return [d for d, _ in ranked[:top_n]]
+        t0 = time.perf_counter()
+        try:
+            q_hash = hashlib.sha1(" ".join(query.split()).encode("utf-8")).hexdigest()
+            keys = [
+                (self._reranker_name, q_hash, hashlib.sha1(d.page_content.encode("utf-8")).hexdigest())
+                for d in docs
+            ]
+            scores: List[Optional[float]] = [self._rerank_cache.get(key) for key in keys]
+            todo = [i for i, sc in enumerate(scores) if sc is None]
+            if todo:
+                limit = self._rerank_max_chars or None
+                pairs = [(query, docs[i].page_content[:limit]) for i in todo]
+                try:
+                    fresh = self._rerank_batcher.submit(pairs) if self._rerank_batcher else self._predict_pairs(pairs)
+                except Exception:
+                    return None
+                for i, sc in zip(todo, fresh):
+                    scores[i] = float(sc)  # higher is better
+                    self._rerank_cache.set(keys[i], scores[i])
+            ranked = sorted(zip(docs, scores), key=lambda x: float(x[1]), reverse=True)
+            if stats is not None:
+                stats.update({
+                    "pairs": len(docs),
+                    "cache_hits": len(docs) - len(todo),
+                    "scored": len(todo),
+                    "rerank_ms": round((time.perf_counter() - t0) * 1000, 2),
+                })
+            return [d for d, _ in ranked[:top_n]]
+        finally:
+            # Every path, so fully cached reranks show up in the histogram too
+            RERANK_SECONDS.observe(time.perf_counter() - t0, model=self._reranker_name)
+
+    def _predict_pairs(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        scores = self._reranker.predict(pairs, batch_size=self._rerank_batch_size, show_progress_bar=False)
+        return [float(sc) for sc in scores]
+
+    def batchers(self) -> Dict[str, MicroBatcher]:
+        found = {
+            "query_embedding": getattr(getattr(self.embeddings, "inner", None), "batcher", None),
+            "rerank": self._rerank_batcher,
+        }
+        return {name: b for name, b in found.items() if isinstance(b, MicroBatcher)}
+
+    def rerank_cache_stats(self) -> Dict[str, Any]:
+        return self._rerank_cache.stats()
 
     # Indexing with hybrid chunking
+    @staticmethod
+    def _stored_chunks(vs: Any) -> Dict[str, Dict[str, Any]]:
+        """id -> metadata of everything in the given vector store."""
+        getter = getattr(vs, "get", None)
+        if not callable(getter):
+            return {}
+        res = getter(include=["metadatas"])
+        return {cid: (meta or {}) for cid, meta in zip(res.get("ids") or [], res.get("metadatas") or [])}
+
+    @staticmethod
+    def _stored_vectors(vs: Any, ids: List[str]) -> Dict[str, Any]:
+        """id -> stored embedding, so unchanged chunks move to a new version without re-embedding."""
+        source = getattr(vs, "_collection", None) or vs
+        out: Dict[str, Any] = {}
+        for i in range(0, len(ids), _WRITE_BATCH):
+            res = source.get(ids=ids[i:i + _WRITE_BATCH], include=["embeddings"])
+            embs = res.get("embeddings")
+            if embs is None:
+                continue
+            for cid, vec in zip(res.get("ids") or [], embs):
+                out[cid] = vec
+        return out
+
+    @staticmethod
+    def _write_vectors(vs: Any, ids: List[str], texts: List[str], metas: List[Dict[str, Any]], vectors: np.ndarray) -> None:
+        if not ids:
+            return
+        if isinstance(vs, NumpyVectorStore):
+            vs.add_embeddings(texts, vectors, metas, ids)
+            return
+        coll = vs._collection
+        for i in range(0, len(ids), _WRITE_BATCH):
+            part = slice(i, i + _WRITE_BATCH)
+            coll.upsert(ids=ids[part], documents=texts[part], metadatas=metas[part], embeddings=vectors[part].tolist())
+
+    def _embed_documents_array(self, texts: List[str]) -> np.ndarray:
+        with self._embed_timer("document"):
+            fast = getattr(self.embeddings, "embed_documents_array", None)
+            if callable(fast):
+                return np.asarray(fast(texts), dtype=np.float32)
+            return np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+
     def reindex(
         self,
         docs_path: Optional[str] = None,
         chunk_chars: int = 600,
         overlap: int = 120,
+        full: bool = False,
+        progress: Optional[Callable[[str, int, int], None]] = None,
     ) -> Dict[str, Any]:
-        docs_dir = Path(docs_path or settings.DOCUMENTS_PATH).expanduser().resolve()
-        files = _read_text_files(docs_dir)
-
-        texts: List[str] = []
-        metas: List[Dict[str, Any]] = []
-
-        for fname, raw in files:
-            pieces = _hybrid_chunk(
-                raw,
-                filename=fname,
-                chunk_chars=chunk_chars,
-                overlap=overlap,
-            )
-            for content, meta in pieces:
-                texts.append(content)
-                metas.append(meta)
+        """
+        Blue/green rebuild: the new index is written to a fresh version directory
+        while the current one keeps serving, then swapped in atomically and old
+        versions are garbage-collected.
 
-        # Reset and add
-        self._reset_vs()
-        if texts:
-            try:
-                self.vs.add_texts(texts=texts, metadatas=metas)
-            except Exception:
-                docs = [Document(page_content=t, metadata=m) for t, m in zip(texts, metas)]
+        Chunks are identified by a content hash (text, source, chunking parameters,
+        embedding model), so unchanged chunks are copied with their stored vectors
+        and only new ones are embedded; nothing is rebuilt when nothing changed.
+        full=True re-embeds every chunk.
+
+        progress(phase, done, total) is called as the build advances through the
+        phases reading, diffing, copying, embedding, writing and publishing.
+        """
+        def _report(phase: str, done: int = 0, total: int = 0) -> None:
+            if progress is not None:
                 try:
-                    self.vs.add_documents(docs)
+                    progress(phase, done, total)
                 except Exception:
                     pass
+
+        with self._index_lock:
+            _report("reading")
+            docs_dir = Path(docs_path or settings.DOCUMENTS_PATH).expanduser().resolve()
+            files = _read_text_files(docs_dir)
+
+            texts: List[str] = []
+            metas: List[Dict[str, Any]] = []
+
+            for fname, raw in files:
+                pieces = _hybrid_chunk(
+                    raw,
+                    filename=fname,
+                    chunk_chars=chunk_chars,
+                    overlap=overlap,
+                )
+                for content, meta in pieces:
+                    texts.append(content)
+                    metas.append(meta)
+
+            model_name = getattr(self.embeddings, "model_name", "unknown")
+            doc_prefix = getattr(self.embeddings, "doc_prefix", "")
+            ids = _chunk_ids(list(zip(texts, metas)), chunk_chars, overlap, model_name, doc_prefix)
+
+            # Drop cached query vectors if the embedding model changed
+            sync = getattr(self.embeddings, "sync_model", None)
+            if callable(sync):
+                sync()
+
+            _report("diffing", 0, len(ids))
+            old_vs = self.vs
+            stored: Dict[str, Dict[str, Any]] = {}
             try:
-                self.vs.persist()
+                stored = self._stored_chunks(old_vs)
             except Exception:
-                pass
+                full = True
 
-        return {
-            "docs_path": str(docs_dir),
-            "files_indexed": len(files),
-            "chunks_indexed": len(texts),
-            "embedding_model": getattr(self.embeddings, "model_name", "unknown"),
-            "doc_prefix": getattr(self.embeddings, "doc_prefix", ""),
-            "query_prefix": getattr(self.embeddings, "query_prefix", ""),
-            "chunk_chars": chunk_chars,
-            "overlap": overlap,
-        }
+            wanted = set(ids)
+            new_pos = [i for i, cid in enumerate(ids) if cid not in stored]
+            stale = [cid for cid in stored if cid not in wanted]
+            # Same content, moved within its file (section/chunk indices shifted): metadata only
+            moved = [i for i, cid in enumerate(ids) if cid in stored and stored[cid] != metas[i]]
+
+            t0 = time.perf_counter()
+            embedded = 0
+            gc_removed: List[str] = []
+            if full or stale or moved or new_pos:
+                new_dir = new_index_dir(self.persist_dir)
+                try:
+                    new_vs = self._open_vs(new_dir)
+                    kept = [] if full else [ids[i] for i in range(len(ids)) if ids[i] in stored]
+                    _report("copying", 0, len(kept))
+                    copied = self._stored_vectors(old_vs, kept) if kept else {}
+                    todo = [i for i, cid in enumerate(ids) if cid not in copied]
+                    vectors: List[Any] = [copied.get(cid) for cid in ids]
+                    # Embedded in slices so progress advances during long builds
+                    step = max(1, int(os.getenv("RAG_REINDEX_EMBED_BATCH", "512")))
+                    _report("embedding", 0, len(todo))
+                    for start in range(0, len(todo), step):
+                        part = todo[start:start + step]
+                        fresh = self._embed_documents_array([texts[i] for i in part])
+                        for j, i in enumerate(part):
+                            vectors[i] = fresh[j]
+                        embedded += len(part)
+                        _report("embedding", embedded, len(todo))
+                    matrix = np.asarray(vectors, dtype=np.float32) if vectors else np.zeros((0, 0), dtype=np.float32)
+                    _report("writing", 0, len(ids))
+                    self._write_vectors(new_vs, ids, texts, metas, matrix)
+                    try:
+                        new_vs.persist()
+                    except Exception:
+                        pass
+                except Exception:
+                    log.warning("index build failed; keeping %s\n%s", self.index_dir, traceback.format_exc())
+                    _evict_chroma_client(new_dir)
+                    shutil.rmtree(new_dir, ignore_errors=True)
+                    raise
+                _report("publishing", len(ids), len(ids))
+                self._publish(new_dir, new_vs, BM25Index.build(texts, metas, ids))
+                gc_removed = self._gc_index_versions()
+            index_seconds = time.perf_counter() - t0
+
+            return {
+                "docs_path": str(docs_dir),
+                "mode": "full" if full else "incremental",
+                "files_indexed": len(files),
+                "chunks_indexed": len(texts),
+                "added": len(new_pos),
+                "removed": len(stale),
+                "unchanged": len(texts) - len(new_pos),
+                "metadata_updated": len(moved),
+                "embedded": embedded,
+                "corpus_version": self.corpus_version,
+                "index_dir": self.index_dir,
+                "index_versions_removed": gc_removed,
+                "embedding_model": model_name,
+                "doc_prefix": doc_prefix,
+                "query_prefix": getattr(self.embeddings, "query_prefix", ""),
+                "chunk_chars": chunk_chars,
+                "overlap": overlap,
+                "index_seconds": round(index_seconds, 3),
+                "chunks_per_sec": round(embedded / index_seconds, 2) if (index_seconds > 0 and embedded) else None,
+                "embedding_counters": self._embedding_counters(),
+            }
+
+    def _embedding_counters(self) -> Optional[Dict[str, Any]]:
+        snap = getattr(self.embeddings, "counters_snapshot", None)
+        try:
+            return snap() if callable(snap) else None
+        except Exception:
+            return None
 
     def stats(self) -> Dict[str, Any]:
         info: Dict[str, Any] = {
             "persist_dir": self.persist_dir,
-            "embedding_impl": type(self.embeddings).__name__,
+            "index_dir": self.index_dir,
+            "index_versions": [p.name for p in self._index_versions()],
+            "embedding_impl": type(self._base_embeddings()).__name__,
             "embedding_model": getattr(self.embeddings, "model_name", "unknown"),
             "doc_prefix": getattr(self.embeddings, "doc_prefix", ""),
             "query_prefix": getattr(self.embeddings, "query_prefix", ""),
+            "corpus_version": self.corpus_version,
+            "vector_backend": self.vector_backend,
+            "retrieval_mode": self.retrieval_mode,
         }
+        if self.bm25 is not None:
+            info["bm25"] = self.bm25.stats()
+        info["rerank_cache"] = self._rerank_cache.stats()
+        info["microbatch"] = {name: b.stats() for name, b in self.batchers().items()}
+        cache = getattr(self.embeddings, "cache", None)
+        if cache is not None:
+            info["query_embedding_cache"] = cache.stats()
+        doc_cache = get_embedding_cache()
+        if doc_cache is not None:
+            info["document_embedding_cache"] = doc_cache.stats()
+        vs = self.vs
+        if isinstance(vs, NumpyVectorStore):
+            info["vector_count"] = vs.count()
         try:
-            coll = getattr(self.vs, "_collection", None)
+            coll = getattr(vs, "_collection", None)
             if coll:
                 info["collection_name"] = getattr(coll, "name", None)
                 try:
@@ -338,9 +1280,54 @@ class RAGStore:
 
 
 _rag: RAGStore | None = None
+_rag_lock = threading.Lock()
 
 def get_rag() -> RAGStore:
+    # Double-checked: concurrent first requests must not each load the models
     global _rag
     if _rag is None:
-        _rag = RAGStore(persist_dir=settings.CHROMA_DB_PATH)
+        with _rag_lock:
+            if _rag is None:
+                _rag = RAGStore(persist_dir=settings.CHROMA_DB_PATH)
+    # Pick up a reindex published by another worker process
+    _rag.reload_if_published()
+    return _rag
+
+
+def _store_metrics() -> Iterable[Tuple[str, str, Dict[str, Any], float]]:
+    """Scrape-time gauges for /metrics: cache hit/miss counts and micro-batch sizes."""
+    rag = _rag
+    if rag is None:
+        return
+    caches = {
+        "query_embedding": getattr(rag.embeddings, "cache", None),
+        "rerank": rag._rerank_cache,
+        "document_embedding": get_embedding_cache(),
+    }
+    for name, cache in caches.items():
+        if cache is None:
+            continue
+        for kind in ("hits", "misses"):
+            yield "rag_cache_lookups", "Cache lookups by cache and result (cumulative)", {"cache": name, "result": kind}, getattr(cache, kind)
+    yield "rag_reranker_enabled", "1 when a cross-encoder reranker is loaded", {}, float(rag._reranker is not None)
+    yield "rag_corpus_version", "Reindexes since startup", {}, rag.corpus_version
+    for name, batcher in rag.batchers().items():
+        yield "rag_microbatch_batches", "Forward passes run by each micro-batcher", {"batcher": name}, batcher.batches
+        yield "rag_microbatch_items", "Inputs served by each micro-batcher", {"batcher": name}, batcher.items
+
+
+metrics_registry.register_collector(_store_metrics)
+
+
+def preload_rag() -> RAGStore:
+    """Build the singleton in a pre-fork master (see RAGStore fork_safe)."""
+    global _rag
+    with _rag_lock:
+        if _rag is None:
+            _rag = RAGStore(persist_dir=settings.CHROMA_DB_PATH, fork_safe=True)
+    return _rag
+
+
+def peek_rag() -> RAGStore | None:
+    """The store if it has been built, without building it."""
     return _rag
\ No newline at end of file
@@ -0,0 +1,311 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from .config import settings
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: every process watches on its own
+    fcntl = None  # type: ignore
+
+log = logging.getLogger("app.rag")
+
+# -------------------------------
+# Reindex jobs
+# -------------------------------
+
+class ReindexJob:
+    def __init__(self, params: Dict[str, Any], trigger: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.params = dict(params)
+        self.trigger = trigger
+        self.status = "queued"  # queued | running | succeeded | failed
+        self.phase = "queued"
+        self.done = 0
+        self.total = 0
+        self.coalesced = 0
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.phase_started_at: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.finished = threading.Event()
+
+    def progress(self, phase: str, done: int, total: int) -> None:
+        if phase != self.phase:
+            self.phase, self.phase_started_at = phase, time.time()
+        self.done, self.total = done, total
+
+    def to_dict(self) -> Dict[str, Any]:
+        now = time.time()
+        elapsed = ((self.finished_at or now) - self.started_at) if self.started_at else None
+        rate = None
+        if self.phase == "embedding" and self.phase_started_at and self.done:
+            rate = round(self.done / max(now - self.phase_started_at, 1e-6), 2)
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "trigger": self.trigger,
+            "params": self.params,
+            "phase": self.phase,
+            "progress": {"done": self.done, "total": self.total},
+            "chunks_per_sec": rate if rate is not None else (self.result or {}).get("chunks_per_sec"),
+            "coalesced_requests": self.coalesced,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round(elapsed, 3) if elapsed is not None else None,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class ReindexJobManager:
+    """
+    Runs RAGStore.reindex jobs one at a time on a background thread.
+
+    A request whose parameters match a job that has not started reading the
+    documents yet is coalesced into that job: it will still see every change
+    made before the request arrived.
+    """
+    def __init__(self, get_store: Callable[[], Any], history: int = 50):
+        self._get_store = get_store
+        self._history = max(1, history)
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, ReindexJob]" = OrderedDict()
+        self._queue: Deque[ReindexJob] = deque()
+        self._running: Optional[ReindexJob] = None
+        self._wakeup = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self.last_params: Optional[Dict[str, Any]] = None
+
+    def submit(self, params: Dict[str, Any], trigger: str = "api") -> Tuple[ReindexJob, bool]:
+        """Queue a reindex; returns (job, coalesced)."""
+        params = dict(params)
+        params["docs_path"] = str(Path(params.get("docs_path") or settings.DOCUMENTS_PATH).expanduser().resolve())
+        with self._lock:
+            for job in list(self._queue) + ([self._running] if self._running else []):
+                if job.params == params and job.phase == "queued":
+                    job.coalesced += 1
+                    return job, True
+            job = ReindexJob(params, trigger)
+            self._jobs[job.id] = job
+            while len(self._jobs) > self._history:
+                oldest = next(iter(self._jobs.values()))
+                if oldest.status in {"queued", "running"}:
+                    break
+                self._jobs.popitem(last=False)
+            self._queue.append(job)
+            self._ensure_worker()
+        self._wakeup.set()
+        return job, False
+
+    def get(self, job_id: str) -> Optional[ReindexJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[ReindexJob]:
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="rag-reindex", daemon=True)
+            self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait()
+            with self._lock:
+                if not self._queue:
+                    self._wakeup.clear()
+                    continue
+                job = self._queue.popleft()
+                self._running = job
+            self._execute(job)
+            with self._lock:
+                self._running = None
+
+    def _execute(self, job: ReindexJob) -> None:
+        job.status, job.started_at = "running", time.time()
+        try:
+            store = self._get_store()
+            job.result = store.reindex(progress=job.progress, **job.params)
+            job.status = "succeeded"
+            self.last_params = dict(job.params)
+        except Exception as e:
+            job.status, job.error = "failed", f"{type(e).__name__}: {e}"
+            log.warning("reindex job %s failed\n%s", job.id, traceback.format_exc())
+        finally:
+            job.phase = "done" if job.status == "succeeded" else "failed"
+            job.finished_at = time.time()
+            job.finished.set()
+
+
+# -------------------------------
+# Documents watcher (polling)
+# -------------------------------
+
+def _snapshot(docs_dir: Path) -> Dict[str, Tuple[int, int]]:
+    out: Dict[str, Tuple[int, int]] = {}
+    if not docs_dir.exists():
+        return out
+    for p in docs_dir.rglob("*"):
+        if p.is_file() and p.suffix.lower() in {".txt", ".md"}:
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            out[str(p)] = (st.st_mtime_ns, st.st_size)
+    return out
+
+
+class DocsWatcher:
+    """
+    Polls the documents directory and submits an incremental reindex once a change
+    has been stable for `debounce` seconds (editors and copies write in bursts).
+    Uses the parameters of the last successful job, or the reindex defaults.
+
+    With lock_path, only the process holding an exclusive flock on it watches (one
+    reindex per change, not one per gunicorn worker); the others retry the lock
+    every poll and take over if the holder exits. They pick up the published index
+    through RAGStore.reload_if_published().
+    """
+    def __init__(
+        self,
+        manager: ReindexJobManager,
+        docs_path: str,
+        interval: float = 2.0,
+        debounce: float = 3.0,
+        lock_path: Optional[str] = None,
+    ):
+        self.manager = manager
+        self.docs_dir = Path(docs_path).expanduser().resolve()
+        self.interval = max(0.1, interval)
+        self.debounce = max(0.0, debounce)
+        self.lock_path = lock_path
+        self._lock_file: Optional[Any] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def leader(self) -> bool:
+        return self._lock_file is not None or self.lock_path is None or fcntl is None
+
+    def _lead(self) -> bool:
+        if self.leader:
+            return True
+        try:
+            Path(self.lock_path).parent.mkdir(parents=True, exist_ok=True)
+            f = open(self.lock_path, "a+")
+        except OSError:
+            return False
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._lock_file = f
+        log.info("docs watcher: this process (pid %d) watches %s", os.getpid(), self.docs_dir)
+        return True
+
+    def _release(self) -> None:
+        if self._lock_file is not None:
+            self._lock_file.close()  # closing drops the flock
+            self._lock_file = None
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="rag-docs-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        try:
+            self._watch()
+        finally:
+            self._release()
+
+    def _watch(self) -> None:
+        seen: Optional[Dict[str, Tuple[int, int]]] = None
+        changed_at: Optional[float] = None
+        while True:
+            if self._lead():
+                seen, changed_at = self._poll(seen, changed_at)
+            if self._stop.wait(self.interval):
+                return
+
+    def _poll(
+        self, seen: Optional[Dict[str, Tuple[int, int]]], changed_at: Optional[float]
+    ) -> Tuple[Dict[str, Tuple[int, int]], Optional[float]]:
+        current = _snapshot(self.docs_dir)
+        if seen is None:
+            # Just started (or took over): changes are counted from here
+            return current, None
+        if current != seen:
+            return current, time.monotonic()
+        if changed_at is not None and time.monotonic() - changed_at >= self.debounce:
+            params = self.manager.last_params or {}
+            job, _ = self.manager.submit(
+                {**params, "docs_path": str(self.docs_dir), "full": False}, trigger="watcher"
+            )
+            log.info("docs changed; reindex job %s", job.id)
+            return seen, None
+        return seen, changed_at
+
+
+_manager: Optional[ReindexJobManager] = None
+_watcher: Optional[DocsWatcher] = None
+_init_lock = threading.Lock()
+
+
+def get_reindex_jobs() -> ReindexJobManager:
+    global _manager
+    if _manager is None:
+        with _init_lock:
+            if _manager is None:
+                from .rag import get_rag
+                _manager = ReindexJobManager(get_rag)
+    return _manager
+
+
+def start_docs_watcher() -> Optional[DocsWatcher]:
+    """
+    Start the documents watcher when enabled from env:
+      - RAG_WATCH_DOCS (default 0)
+      - RAG_WATCH_INTERVAL seconds between polls (default 2)
+      - RAG_WATCH_DEBOUNCE seconds a change must settle before reindexing (default 3)
+      - RAG_WATCH_LOCK lock file electing the one process that watches
+        (default <CHROMA_DB_PATH>/docs-watcher.lock)
+    """
+    global _watcher
+    if os.getenv("RAG_WATCH_DOCS", "0").strip().lower() not in {"1", "true", "yes", "on"}:
+        return None
+    if _watcher is None:
+        _watcher = DocsWatcher(
+            get_reindex_jobs(),
+            settings.DOCUMENTS_PATH,
+            interval=float(os.getenv("RAG_WATCH_INTERVAL", "2")),
+            debounce=float(os.getenv("RAG_WATCH_DEBOUNCE", "3")),
+            lock_path=os.getenv("RAG_WATCH_LOCK") or str(Path(settings.CHROMA_DB_PATH) / "docs-watcher.lock"),
+        )
+    _watcher.start()
+    return _watcher
+
+
+def stop_docs_watcher() -> None:
+    if _watcher is not None:
+        _watcher.stop()
@@ -0,0 +1,350 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+VECTORS_FILE = "vectors.npy"
+META_FILE = "meta.json"
+
+
+def _unit_rows(mat: np.ndarray) -> np.ndarray:
+    mat = np.asarray(mat, dtype=np.float32)
+    if mat.ndim == 1:
+        mat = mat[None, :]
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (mat / norms).astype(np.float32, copy=False)
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first (argpartition + sort of the k winners)."""
+    n = scores.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.zeros((0,), dtype=np.int64)
+    if k < n:
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(n)
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+def mmr_select(query_sims: np.ndarray, cand_sims: np.ndarray, k: int, lambda_mult: float = 0.5) -> List[int]:
+    """
+    Greedy maximal marginal relevance over a candidate set.
+    query_sims: (n,) similarity of each candidate to the query
+    cand_sims:  (n, n) candidate-candidate similarity matrix
+    Returns positions into the candidate set, in selection order (callers return
+    documents in candidate order, as LangChain does).
+    """
+    n = query_sims.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return []
+    selected = [int(np.argmax(query_sims))]
+    # Highest similarity of every candidate to anything already selected
+    redundancy = cand_sims[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+    while len(selected) < k:
+        scores = lambda_mult * query_sims - (1.0 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        nxt = int(np.argmax(scores))
+        selected.append(nxt)
+        available[nxt] = False
+        np.maximum(redundancy, cand_sims[nxt], out=redundancy)
+    return selected
+
+
+class CandidateSet:
+    """
+    Union of the top-fetch_k candidates of several query vectors, with everything
+    MMR needs precomputed once per request:
+      - docs:       candidate Documents
+      - vectors:    (m, d) unit-normalized candidate embeddings
+      - query_sims: (q, m) cosine similarity of each query to each candidate
+      - own:        per query, positions of its own top-fetch_k candidates (best first)
+    """
+    def __init__(self, docs: List[Document], vectors: np.ndarray, query_sims: np.ndarray, own: List[np.ndarray]):
+        self.docs = docs
+        self.vectors = vectors
+        self.query_sims = query_sims
+        self.own = own
+        self._pairwise: Optional[np.ndarray] = None
+
+    @classmethod
+    def build(cls, docs: List[Document], vectors: np.ndarray, queries: np.ndarray, own: List[np.ndarray]) -> "CandidateSet":
+        vectors = _unit_rows(vectors) if len(docs) else np.zeros((0, queries.shape[1]), dtype=np.float32)
+        return cls(docs, vectors, _unit_rows(queries) @ vectors.T, own)
+
+    @property
+    def pairwise(self) -> np.ndarray:
+        # Candidate-candidate similarity, computed once and shared by every query's MMR
+        if self._pairwise is None:
+            self._pairwise = self.vectors @ self.vectors.T
+        return self._pairwise
+
+    def mmr(self, qi: int, k: int, lambda_mult: float = 0.5) -> List[Document]:
+        """
+        Classic per-query MMR restricted to query qi's own candidates. Picks come back in
+        candidate (similarity-rank) order, as LangChain's Chroma store returns them.
+        """
+        own = self.own[qi]
+        if own.size == 0:
+            return []
+        picked = mmr_select(self.query_sims[qi, own], self.pairwise[np.ix_(own, own)], k, lambda_mult)
+        return [self.docs[int(own[p])] for p in sorted(picked)]
+
+    def mmr_multi(self, k: int, lambda_mult: float = 0.5) -> List[Document]:
+        """
+        One diverse set for all queries: relevance is the best similarity to any query
+        vector, and picks come back in that relevance order, like mmr().
+        """
+        if not self.docs:
+            return []
+        relevance = self.query_sims.max(axis=0)
+        picked = mmr_select(relevance, self.pairwise, k, lambda_mult)
+        picked.sort(key=lambda p: -relevance[p])
+        return [self.docs[p] for p in picked]
+
+    def top(self, qi: int, k: int) -> List[Document]:
+        return [self.docs[int(p)] for p in self.own[qi][:k]]
+
+
+class NumpyVectorStore:
+    """
+    Exact-search vector store for small corpora: every chunk embedding lives in one
+    contiguous, L2-normalized float32 matrix with parallel id/text/metadata arrays,
+    so a search is a single matmul plus argpartition. Persists as vectors.npy plus
+    a meta.json sidecar in persist_directory (None: in memory only).
+
+    Implements the subset of the LangChain VectorStore API that RAGStore uses.
+    Relevance scores are cosine similarities.
+
+    The matrix is memory-mapped read-only from vectors.npy by default
+    (RAG_NUMPY_MMAP=0 loads it onto the heap): pages come from the OS page cache,
+    so every worker process shares one copy. Writes always build new arrays.
+    """
+    def __init__(self, persist_directory: Optional[str], embedding_function: Any, mmap: Optional[bool] = None):
+        self.persist_directory = str(persist_directory) if persist_directory else None
+        self.embeddings = embedding_function
+        if mmap is None:
+            mmap = os.getenv("RAG_NUMPY_MMAP", "1").strip().lower() not in {"0", "false", "off", "no"}
+        self.mmap = mmap
+        self._lock = threading.RLock()
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metas: List[Dict[str, Any]] = []
+        self._load()
+
+    # Persistence
+    def _paths(self) -> Tuple[Path, Path]:
+        base = Path(self.persist_directory or "")
+        return base / VECTORS_FILE, base / META_FILE
+
+    def _load(self) -> None:
+        if self.persist_directory is None:
+            return
+        vec_path, meta_path = self._paths()
+        if not (vec_path.exists() and meta_path.exists()):
+            return
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            matrix = np.load(vec_path, mmap_mode="r" if self.mmap else None)
+        except Exception:
+            return
+        if matrix.shape[0] != len(meta.get("ids", [])):
+            return
+        self._matrix = matrix.astype(np.float32, copy=False)
+        self._ids = list(meta["ids"])
+        self._texts = list(meta.get("texts", []))
+        self._metas = list(meta.get("metadatas", []))
+
+    def persist(self) -> None:
+        if self.persist_directory is None:
+            return
+        vec_path, meta_path = self._paths()
+        vec_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            matrix, ids, texts, metas = self._matrix, list(self._ids), list(self._texts), list(self._metas)
+        # Write to temp files then rename, so readers never see a half-written index
+        tmp_vec = vec_path.with_name(vec_path.name + ".tmp")
+        tmp_meta = meta_path.with_name(meta_path.name + ".tmp")
+        with open(tmp_vec, "wb") as f:
+            np.save(f, matrix)
+        tmp_meta.write_text(json.dumps({"ids": ids, "texts": texts, "metadatas": metas}, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_vec, vec_path)
+        os.replace(tmp_meta, meta_path)
+
+    def delete_collection(self) -> None:
+        with self._lock:
+            self._matrix = np.zeros((0, 0), dtype=np.float32)
+            self._ids, self._texts, self._metas = [], [], []
+        if self.persist_directory is None:
+            return
+        for p in self._paths():
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+
+    # Writes
+    def _embed_documents(self, texts: List[str]) -> np.ndarray:
+        fast = getattr(self.embeddings, "embed_documents_array", None)
+        vecs = fast(texts) if callable(fast) else self.embeddings.embed_documents(texts)
+        return np.asarray(vecs, dtype=np.float32)
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        ids: Optional[List[str]] = None,
+    ) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        with self._lock:
+            start = len(self._ids)
+        ids = ids or [str(start + i) for i in range(len(texts))]
+        return self.add_embeddings(texts, self._embed_documents(texts), metadatas, ids)
+
+    def add_embeddings(
+        self,
+        texts: List[str],
+        embeddings: np.ndarray,
+        metadatas: List[Dict[str, Any]],
+        ids: List[str],
+    ) -> List[str]:
+        """Append precomputed vectors (e.g. copied from a previous index version)."""
+        if not len(texts):
+            return []
+        vecs = _unit_rows(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            self._matrix = vecs if self._matrix.size == 0 else np.vstack([self._matrix, vecs])
+            self._ids.extend(ids)
+            self._texts.extend(texts)
+            self._metas.extend(dict(m) for m in metadatas)
+        return ids
+
+    def add_documents(self, documents: List[Document]) -> List[str]:
+        return self.add_texts([d.page_content for d in documents], [dict(d.metadata) for d in documents])
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> None:
+        if not ids:
+            return
+        drop = set(ids)
+        with self._lock:
+            keep = [i for i, cid in enumerate(self._ids) if cid not in drop]
+            if len(keep) == len(self._ids):
+                return
+            self._matrix = self._matrix[keep] if keep else np.zeros((0, self._matrix.shape[1]), dtype=np.float32)
+            self._ids = [self._ids[i] for i in keep]
+            self._texts = [self._texts[i] for i in keep]
+            self._metas = [self._metas[i] for i in keep]
+
+    def update_metadatas(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            pos = {cid: i for i, cid in enumerate(self._ids)}
+            for cid, meta in zip(ids, metadatas):
+                if cid in pos:
+                    self._metas[pos[cid]] = dict(meta)
+
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None, **kwargs: Any) -> Dict[str, Any]:
+        """Chroma-style get(): ids plus the requested fields ("documents", "metadatas", "embeddings")."""
+        include = include if include is not None else ["documents", "metadatas"]
+        with self._lock:
+            wanted = set(ids) if ids is not None else None
+            rows = range(len(self._ids)) if wanted is None else [i for i, cid in enumerate(self._ids) if cid in wanted]
+            out: Dict[str, Any] = {"ids": [self._ids[i] for i in rows]}
+            if "documents" in include:
+                out["documents"] = [self._texts[i] for i in rows]
+            if "metadatas" in include:
+                out["metadatas"] = [dict(self._metas[i]) for i in rows]
+            if "embeddings" in include:
+                out["embeddings"] = self._matrix[list(rows)] if len(self._ids) else np.zeros((0, 0), dtype=np.float32)
+        return out
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    # Reads
+    def _embed_query(self, query: str) -> np.ndarray:
+        return _unit_rows(np.asarray(self.embeddings.embed_query(query), dtype=np.float32))[0]
+
+    def _snapshot(self) -> Tuple[np.ndarray, List[str], List[Dict[str, Any]]]:
+        with self._lock:
+            return self._matrix, self._texts, self._metas
+
+    def _doc(self, i: int, texts: List[str], metas: List[Dict[str, Any]]) -> Document:
+        return Document(page_content=texts[i], metadata=dict(metas[i]))
+
+    def _search(self, vector: Sequence[float], k: int) -> List[Tuple[Document, float]]:
+        matrix, texts, metas = self._snapshot()
+        if matrix.shape[0] == 0:
+            return []
+        q = _unit_rows(np.asarray(vector, dtype=np.float32))[0]
+        scores = matrix @ q
+        return [(self._doc(int(i), texts, metas), float(scores[i])) for i in top_k_indices(scores, k)]
+
+    def similarity_search_by_vector(self, embedding: Sequence[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [d for d, _ in self._search(embedding, k)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self._embed_query(query), k=k)
+
+    def similarity_search_with_relevance_scores(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self._search(self._embed_query(query), k)
+
+    def candidates_by_vectors(self, queries: np.ndarray, fetch_k: int) -> CandidateSet:
+        """Top-fetch_k candidates of every query with a single (q x n) matmul."""
+        matrix, texts, metas = self._snapshot()
+        q = _unit_rows(queries)
+        if matrix.shape[0] == 0:
+            return CandidateSet([], np.zeros((0, q.shape[1]), dtype=np.float32), np.zeros((q.shape[0], 0), dtype=np.float32), [np.zeros((0,), dtype=np.int64)] * q.shape[0])
+        scores = q @ matrix.T
+        per_query = [top_k_indices(row, fetch_k) for row in scores]
+        union = np.unique(np.concatenate(per_query))
+        pos = {int(i): p for p, i in enumerate(union)}
+        own = [np.asarray([pos[int(i)] for i in idx], dtype=np.int64) for idx in per_query]
+        docs = [self._doc(int(i), texts, metas) for i in union]
+        # Stored rows are already unit length
+        return CandidateSet(docs, matrix[union], scores[:, union], own)
+
+    def max_marginal_relevance_search_by_vector(
+        self,
+        embedding: Sequence[float],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        **kwargs: Any,
+    ) -> List[Document]:
+        matrix, texts, metas = self._snapshot()
+        if matrix.shape[0] == 0:
+            return []
+        q = _unit_rows(np.asarray(embedding, dtype=np.float32))[0]
+        scores = matrix @ q
+        cand = top_k_indices(scores, max(k, fetch_k))
+        cand_vecs = matrix[cand]
+        picked = mmr_select(scores[cand], cand_vecs @ cand_vecs.T, k, lambda_mult)
+        # Candidate (similarity-rank) order, as LangChain's Chroma store returns MMR picks
+        return [self._doc(int(cand[p]), texts, metas) for p in sorted(picked)]
+
+    def max_marginal_relevance_search(
+        self,
+        query: str,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        **kwargs: Any,
+    ) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(
+            self._embed_query(query), k=k, fetch_k=fetch_k, lambda_mult=lambda_mult
+        )
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+import traceback
+from typing import Any, Dict, Optional
+
+log = logging.getLogger("app.rag")
+
+
+class WarmupState:
+    def __init__(self) -> None:
+        self.status = "pending"  # pending | warming | ready | failed
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.components: Dict[str, float] = {}
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            "status": self.status,
+            "ready": self.ready,
+            "components_seconds": dict(self.components),
+            "total_seconds": round(end - self.started_at, 3) if self.started_at else None,
+            "error": self.error,
+        }
+
+
+warmup_state = WarmupState()
+
+
+def _run() -> None:
+    from .rag import get_rag
+
+    state = warmup_state
+    try:
+        t0 = time.perf_counter()
+        rag = get_rag()
+        state.components["rag_store"] = round(time.perf_counter() - t0, 3)
+        state.components.update(rag.warm_up())
+        state.status = "ready"
+        log.info("warm-up finished: %s", state.components)
+    except Exception as e:
+        state.status, state.error = "failed", f"{type(e).__name__}: {e}"
+        log.warning("warm-up failed\n%s", traceback.format_exc())
+    finally:
+        state.finished_at = time.time()
+
+
+def start_warmup() -> WarmupState:
+    """
+    Build the RAG store (embedding model, vector store), load the reranker and run
+    a dummy query on a background thread, so the process can answer liveness
+    checks while it warms. RAG_WARMUP=0 skips it and reports ready immediately.
+    """
+    state = warmup_state
+    with state._lock:
+        if state._thread is not None or state.status != "pending":
+            return state
+        state.started_at = time.time()
+        if os.getenv("RAG_WARMUP", "1").strip().lower() in {"0", "false", "off", "no"}:
+            state.status, state.finished_at = "ready", state.started_at
+            return state
+        state.status = "warming"
+        state._thread = threading.Thread(target=_run, name="rag-warmup", daemon=True)
+        state._thread.start()
+    return state
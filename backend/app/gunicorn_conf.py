@@ -0,0 +1,41 @@
+"""
+gunicorn settings for production (uvicorn workers, models preloaded before fork).
+
+From backend/:
+    gunicorn -c app/gunicorn_conf.py app.main:app
+
+With preload (default) the master loads the embedding model, reranker and index
+once and forks workers that share them copy-on-write, so each extra worker costs
+a few MB instead of a full model copy.
+
+Env:
+  - PORT (default 8000)
+  - WEB_CONCURRENCY (workers, default 2)
+  - GUNICORN_PRELOAD (default 1)
+  - GUNICORN_TIMEOUT (default 120)
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.getenv("GUNICORN_PRELOAD", "1").strip().lower() not in {"0", "false", "off", "no"}
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+
+def when_ready(server):
+    # Master, after the app is imported and before the first worker is forked
+    if preload_app:
+        from app.core.preload import preload_shared
+
+        info = preload_shared()
+        server.log.info("preloaded models and index in %ss", info["seconds"])
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from app.core.preload import after_fork
+
+        after_fork()
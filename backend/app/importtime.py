@@ -0,0 +1,110 @@
+"""
+Startup report: where process boot time goes, by module and by package.
+
+Runs `python -X importtime -c "import app.main"` in a fresh interpreter (same env)
+and aggregates its output. Also exposed as GET /api/v1/debug/rag/importtime.
+
+    python -m app.importtime [--module app.main] [--top 25] [--json]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Modules whose presence after boot means a heavy stack was pulled in eagerly
+HEAVY_MODULES = ("torch", "sentence_transformers", "transformers", "chromadb", "langchain_chroma", "onnxruntime")
+
+_CHILD = """
+import json, resource, sys, time
+t = time.perf_counter()
+import {module}
+wall = time.perf_counter() - t
+print(json.dumps({{
+    "wall_seconds": wall,
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "heavy": {{m: m in sys.modules for m in {heavy!r}}},
+}}))
+"""
+
+
+def _parse(stderr: str) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # header line
+        name = parts[2].rstrip()
+        rows.append({
+            "module": name.strip(),
+            "self_ms": int(parts[0]) / 1000,
+            "cumulative_ms": int(parts[1]) / 1000,
+            "depth": (len(name) - len(name.lstrip())) // 2,
+        })
+    return rows
+
+
+def profile_imports(module: str = "app.main", top: int = 25) -> Dict[str, Any]:
+    backend_dir = Path(__file__).resolve().parents[1]
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD.format(module=module, heavy=HEAVY_MODULES)],
+        capture_output=True,
+        text=True,
+        cwd=str(backend_dir),
+        timeout=300,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {module} failed: {proc.stderr.strip().splitlines()[-1:]}")
+    child = json.loads(proc.stdout.strip().splitlines()[-1])
+    rows = _parse(proc.stderr)
+
+    by_package: Dict[str, float] = {}
+    for r in rows:
+        pkg = r["module"].split(".")[0]
+        by_package[pkg] = by_package.get(pkg, 0.0) + r["self_ms"]
+    packages = sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)[:top]
+    slowest = sorted(rows, key=lambda r: r["cumulative_ms"], reverse=True)[:top]
+
+    return {
+        "module": module,
+        "wall_seconds": round(child["wall_seconds"], 3),
+        "max_rss_mb": round(child["max_rss_kb"] / 1024, 1),
+        "modules_imported": len(rows),
+        "heavy_modules_loaded": child["heavy"],
+        "by_package_ms": [{"package": p, "self_ms": round(ms, 1)} for p, ms in packages],
+        "slowest_modules": [
+            {"module": r["module"], "cumulative_ms": round(r["cumulative_ms"], 1), "self_ms": round(r["self_ms"], 1)}
+            for r in slowest
+        ],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import-time report for the backend")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--json", action="store_true", help="print the raw JSON report")
+    args = parser.parse_args()
+    report = profile_imports(args.module, args.top)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"import {report['module']}: {report['wall_seconds']:.3f}s, max RSS {report['max_rss_mb']} MB, "
+          f"{report['modules_imported']} modules")
+    heavy = [m for m, on in report["heavy_modules_loaded"].items() if on]
+    print("heavy modules loaded: " + (", ".join(heavy) or "none"))
+    print("\nby package (self ms)")
+    for row in report["by_package_ms"]:
+        print(f"  {row['self_ms']:>9.1f}  {row['package']}")
+    print("\nslowest modules (cumulative ms / self ms)")
+    for row in report["slowest_modules"]:
+        print(f"  {row['cumulative_ms']:>9.1f}  {row['self_ms']:>8.1f}  {row['module']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -29,16 +29,23 @@ import openai
 import httpx
 
 from .core.config import settings
+from .core.embedding_cache import cached_embed_documents
+from .core.rag import new_index_dir, publish_index_dir
 
 
 class LocalEmbeddings:
     def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
         if SentenceTransformer is None:
             raise RuntimeError("sentence-transformers not installed. Install with: pip install sentence-transformers")
+        self.model_name = model_name
         self.model = SentenceTransformer(model_name)
 
+    def _encode(self, texts: List[str]) -> "np.ndarray":
+        return self.model.encode(texts, show_progress_bar=True, convert_to_numpy=True)
+
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        arr = self.model.encode(texts, show_progress_bar=True, convert_to_numpy=True)
+        # Shared disk cache with RAGStore.reindex: only never-seen chunks are encoded
+        arr = cached_embed_documents(self.model_name, "", texts, self._encode)
         return [list(map(float, v)) for v in arr]
 
     def embed_query(self, text: str) -> List[float]:
@@ -127,8 +134,9 @@ def ingest_documents() -> None:
     # Try to configure embeddings using explicit embedding key/base only
     emb_key, emb_base = configure_embedding_client()
 
-    persist_dir = Path(settings.CHROMA_DB_PATH).expanduser().resolve()
-    persist_dir.mkdir(parents=True, exist_ok=True)
+    # Build into a new index version; the API server keeps serving the current one
+    root_dir = Path(settings.CHROMA_DB_PATH).expanduser().resolve()
+    persist_dir = Path(new_index_dir(str(root_dir)))
 
     if emb_key:
         # Check connectivity to embedding base (if set)
@@ -148,6 +156,7 @@ def ingest_documents() -> None:
 
         vectordb = Chroma.from_documents(documents=docs, embedding=embeddings, persist_directory=str(persist_dir))
         vectordb.persist()
+        publish_index_dir(str(root_dir), str(persist_dir))
         print(f"Done. Persisted to: {persist_dir}")
         return
 
@@ -158,6 +167,7 @@ def ingest_documents() -> None:
     embeddings = LocalEmbeddings()
     vectordb = Chroma.from_documents(documents=docs, embedding=embeddings, persist_directory=str(persist_dir))
     vectordb.persist()
+    publish_index_dir(str(root_dir), str(persist_dir))
     print(f"Done with local embeddings. Persisted to: {persist_dir}")
 
 
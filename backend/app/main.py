@@ -1,15 +1,37 @@
 from __future__ import annotations
 
 import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 from .api.v1.chat import router as chat_router
 from .api.v1.debug_rag import router as debug_rag_router
+from .core.aio import close_http_client, get_http_client, shutdown_executor
+from .core.metrics import render as render_metrics
+from .core.reindex_jobs import start_docs_watcher, stop_docs_watcher
+from .core.warmup import start_warmup, warmup_state
 # If you have the /health router file, you can import and include it as well:
 # from .api.v1.health import router as health_router
 
-app = FastAPI(title="Portfolio Backend")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled (keep-alive, HTTP/2) client for all OpenRouter calls
+    get_http_client()
+    # Load models/index and run a dummy query off the request path; /readyz reports progress
+    start_warmup()
+    # Optional: reindex in the background when DOCUMENTS_PATH changes (RAG_WATCH_DOCS=1)
+    start_docs_watcher()
+    yield
+    stop_docs_watcher()
+    await close_http_client()
+    shutdown_executor()
+
+
+app = FastAPI(title="Portfolio Backend", lifespan=lifespan)
 
 # CORS configuration
 # Comma-separated list of allowed origins (exact matches)
@@ -43,6 +65,16 @@ def health():
 def healthz():
     return {"status": "ok"}
 
+# Readiness: 503 until the warm-up (models, vector store, first query) has finished
+@app.get("/readyz")
+def readyz():
+    return JSONResponse(status_code=200 if warmup_state.ready else 503, content=warmup_state.to_dict())
+
+# Prometheus scrape target: stage/model/provider latency histograms, outcome and cache counters
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Optional: avoid 404 on "/"
 @app.get("/")
 def root():
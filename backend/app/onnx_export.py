@@ -0,0 +1,103 @@
+"""
+Export a sentence-transformers model for the ONNX embedding backend
+(RAG_EMBEDDING_BACKEND=onnx).
+
+    python -m app.onnx_export --model all-mpnet-base-v2 [--out DIR] [--quantize] [--opset 17]
+
+Export needs the build-time stack (torch, transformers, sentence-transformers);
+the server itself then only needs onnxruntime and tokenizers.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+from typing import Any, Dict
+
+from .core.onnx_embeddings import CONFIG_FILE, MODEL_FILE, QUANTIZED_MODEL_FILE, default_model_dir
+
+
+def export(model_name: str, out_dir: str, opset: int = 17, quantize: bool = False) -> Dict[str, Any]:
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    st = SentenceTransformer(model_name, device="cpu")
+    transformer = st[0]
+    model = transformer.auto_model.eval()
+    tokenizer = transformer.tokenizer
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    tokenizer.save_pretrained(str(out))  # fast tokenizers write tokenizer.json
+
+    # Mirror the pipeline after the transformer: pooling mode and optional Normalize module
+    pooling, normalize = "mean", False
+    for module in st:
+        kind = type(module).__name__
+        if kind == "Pooling":
+            if getattr(module, "pooling_mode_cls_token", False):
+                pooling = "cls"
+            elif not getattr(module, "pooling_mode_mean_tokens", True):
+                raise SystemExit(f"Unsupported pooling for ONNX export: {module.get_pooling_mode_str()}")
+        elif kind == "Normalize":
+            normalize = True
+    max_length = int(st.max_seq_length or tokenizer.model_max_length)
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+
+    class _Encoder(torch.nn.Module):
+        def __init__(self, inner: Any):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, *args: Any) -> Any:
+            return self.inner(**dict(zip(input_names, args))).last_hidden_state
+
+    axes = {n: {0: "batch", 1: "tokens"} for n in input_names + ["last_hidden_state"]}
+    model_path = out / MODEL_FILE
+    with torch.no_grad():
+        torch.onnx.export(
+            _Encoder(model),
+            tuple(sample[n] for n in input_names),
+            str(model_path),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=axes,
+            opset_version=opset,
+        )
+
+    config = {
+        "model": model_name,
+        "pooling": pooling,
+        "normalize": normalize,
+        "max_length": max_length,
+        # Padded positions must carry the model's own pad id (1 for MPNet/RoBERTa vocabularies)
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+    }
+    (out / CONFIG_FILE).write_text(json.dumps(config, indent=2), encoding="utf-8")
+
+    info: Dict[str, Any] = {**config, "out_dir": str(out), "onnx_mb": round(model_path.stat().st_size / 1e6, 1)}
+    if quantize:
+        # Dynamic int8: weights quantized offline, activations per batch at runtime
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        q_path = out / QUANTIZED_MODEL_FILE
+        quantize_dynamic(str(model_path), str(q_path), weight_type=QuantType.QInt8)
+        info["int8_mb"] = round(q_path.stat().st_size / 1e6, 1)
+    return info
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export a sentence-transformers model to ONNX")
+    parser.add_argument("--model", default="all-mpnet-base-v2")
+    parser.add_argument("--out", default=None, help="default: ./data/onnx/<model>")
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--quantize", action="store_true", help="also write a dynamic int8 model")
+    args = parser.parse_args()
+    info = export(args.model, args.out or default_model_dir(args.model), opset=args.opset, quantize=args.quantize)
+    print(json.dumps(info, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Embedding backends on our docs: torch SentenceTransformer vs ONNX Runtime (fp32 / int8).
+
+Reports per-query encode latency, document throughput, cosine agreement with the
+torch vectors, and retrieval drift (top-k overlap with the torch ranking).
+
+Parity: queries and chunks of very different lengths are encoded in a single
+padded ONNX batch and compared with SentenceTransformer's vectors; a wrong pad
+token shows up here. Exits 1 if fp32 ONNX falls below --parity-min-cosine.
+
+Run from backend/ after exporting (python -m app.onnx_export --model M --quantize):
+    python -m bench.bench_embeddings [--model all-mpnet-base-v2] [--k 8] [--repeat 3]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.rag import LocalEmbeddings, _hybrid_chunk, _read_text_files
+from app.core.onnx_embeddings import OnnxEmbeddings
+
+QUERIES = [
+    "What projects did he build?",
+    "List his certifications",
+    "Where did he study before engineering school?",
+    "IPEIN preparatory course",
+    "What programming languages does he know?",
+    "Tell me about his professional experience",
+    "Which cloud platforms has he used?",
+    "What is the YouTube Video Summarizer?",
+    "credit card fraud detection model",
+    "How can I contact him?",
+]
+
+
+def _chunks() -> List[str]:
+    docs_dir = Path(settings.DOCUMENTS_PATH).expanduser().resolve()
+    out: List[str] = []
+    for fname, raw in _read_text_files(docs_dir):
+        out.extend(content for content, _ in _hybrid_chunk(raw, filename=fname))
+    return out
+
+
+def _unit(m: np.ndarray) -> np.ndarray:
+    n = np.linalg.norm(m, axis=1, keepdims=True)
+    n[n == 0] = 1.0
+    return m / n
+
+
+def _measure(emb: Any, chunks: List[str], repeat: int) -> Dict[str, Any]:
+    emb.embed_queries_array(QUERIES[:2])  # warm-up
+    lat: List[float] = []
+    for _ in range(repeat):
+        for q in QUERIES:
+            t = time.perf_counter()
+            emb.embed_queries_array([q])
+            lat.append((time.perf_counter() - t) * 1000)
+    t = time.perf_counter()
+    docs = emb._encode_documents(chunks)  # bypass the disk cache
+    doc_s = time.perf_counter() - t
+    lat.sort()
+    return {
+        "query_ms_p50": round(statistics.median(lat), 2),
+        "query_ms_p95": round(lat[int(0.95 * (len(lat) - 1))], 2),
+        "docs_per_sec": round(len(chunks) / doc_s, 1) if doc_s > 0 else None,
+        "_docs": _unit(np.asarray(docs, dtype=np.float32)),
+        "_queries": _unit(np.asarray(emb.embed_queries_array(QUERIES), dtype=np.float32)),
+    }
+
+
+def _drift(ref: Dict[str, Any], other: Dict[str, Any], k: int) -> Dict[str, Any]:
+    cos = (ref["_docs"] * other["_docs"]).sum(axis=1)
+    ref_top = np.argsort(-(ref["_queries"] @ ref["_docs"].T), axis=1)[:, :k]
+    oth_top = np.argsort(-(other["_queries"] @ other["_docs"].T), axis=1)[:, :k]
+    overlap = [len(set(a) & set(b)) / k for a, b in zip(ref_top.tolist(), oth_top.tolist())]
+    return {
+        "doc_cosine_mean": round(float(cos.mean()), 5),
+        "doc_cosine_min": round(float(cos.min()), 5),
+        f"top{k}_overlap_mean": round(float(np.mean(overlap)), 3),
+        f"top{k}_overlap_min": round(float(np.min(overlap)), 3),
+    }
+
+
+def _parity(ref: Any, emb: Any, texts: List[str]) -> Dict[str, Any]:
+    expected = _unit(np.asarray(ref._encode_documents(texts), dtype=np.float32))
+    batch_size = emb.batch_size
+    emb.batch_size = len(texts)  # one batch: every short text is padded to the longest
+    try:
+        got = _unit(np.asarray(emb._encode_documents(texts), dtype=np.float32))
+    finally:
+        emb.batch_size = batch_size
+    cos = (expected * got).sum(axis=1)
+    return {"texts": len(texts), "cosine_min": round(float(cos.min()), 6), "max_abs_diff": round(float(np.abs(expected - got).max()), 6)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=os.getenv("RAG_EMBEDDING_MODEL", "all-mpnet-base-v2"))
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-torch", action="store_true")
+    parser.add_argument("--parity-min-cosine", type=float, default=0.999, help="fp32 ONNX vs SentenceTransformer, per text")
+    args = parser.parse_args()
+
+    chunks = _chunks()
+    report: Dict[str, Any] = {"model": args.model, "chunks": len(chunks), "backends": {}}
+    ref: Optional[Dict[str, Any]] = None
+    torch_emb: Any = None
+    parity_failed = False
+    # Shortest and longest texts together, so padding dominates the short ones
+    by_len = sorted(QUERIES + chunks, key=len)
+    parity_texts = by_len[:16] + by_len[-16:]
+    backends = [("onnx", False), ("onnx-int8", True)]
+    if not args.skip_torch:
+        backends.insert(0, ("torch", None))
+
+    for name, quantized in backends:
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        t = time.perf_counter()
+        try:
+            emb: Any = LocalEmbeddings(args.model) if quantized is None else OnnxEmbeddings(args.model, quantized=quantized)
+        except Exception as e:
+            report["backends"][name] = {"error": str(e)}
+            continue
+        load_s = time.perf_counter() - t
+        res = _measure(emb, chunks, args.repeat)
+        row = {k: v for k, v in res.items() if not k.startswith("_")}
+        row["load_seconds"] = round(load_s, 2)
+        # ru_maxrss is a process high-water mark (KiB on Linux): growth attributable to this backend
+        row["max_rss_growth_mb"] = round((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024, 1)
+        if ref is None:
+            ref = res
+        else:
+            row["vs_" + ("torch" if not args.skip_torch else "onnx")] = _drift(ref, res, args.k)
+        if quantized is None:
+            torch_emb = emb
+        elif torch_emb is not None:
+            row["parity"] = _parity(torch_emb, emb, parity_texts)
+            row["parity"]["ok"] = row["parity"]["cosine_min"] >= args.parity_min_cosine
+            # int8 is expected to drift; only fp32 must match
+            if not quantized and not row["parity"]["ok"]:
+                parity_failed = True
+        report["backends"][name] = row
+
+    print(json.dumps(report, indent=2))
+    if parity_failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Microbenchmark: NumPy feature-extraction pooling vs the previous pure-Python loop.
+
+Run from backend/:
+    python -m bench.bench_mean_pool [--batch 32] [--tokens 256] [--dim 384] [--repeat 5]
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import List
+
+import numpy as np
+
+from app.core.hf_embeddings import _pool_response
+
+
+def _mean_pool_python(matrix: List[List[float]]) -> List[float]:
+    # Reference: implementation before the NumPy rewrite
+    if not matrix:
+        return []
+    rows = len(matrix)
+    cols = len(matrix[0]) if rows else 0
+    if cols == 0:
+        return []
+    sums = [0.0] * cols
+    for row in matrix:
+        if not row:
+            continue
+        if len(row) != cols:
+            row = (row + [0.0] * cols)[:cols]
+        for j, v in enumerate(row):
+            sums[j] += float(v)
+    return [s / max(1, rows) for s in sums]
+
+
+def _payload(batch: int, tokens: int, dim: int, ragged: bool) -> list:
+    rng = random.Random(0)
+    out = []
+    for _ in range(batch):
+        n = rng.randint(max(1, tokens // 4), tokens) if ragged else tokens
+        out.append([[rng.uniform(-1, 1) for _ in range(dim)] for _ in range(n)])
+    return out
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--batch", type=int, default=32)
+    ap.add_argument("--tokens", type=int, default=256)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    for ragged in (False, True):
+        data = _payload(args.batch, args.tokens, args.dim, ragged)
+        py = _best(lambda: [_mean_pool_python(m) for m in data], args.repeat)
+        vec = _best(lambda: _pool_response(data, len(data)), args.repeat)
+        ref = np.asarray([_mean_pool_python(m) for m in data], dtype=np.float32)
+        err = float(np.abs(_pool_response(data, len(data)) - ref).max())
+        label = "ragged" if ragged else "regular"
+        print(
+            f"{label:8s} batch={args.batch} tokens<={args.tokens} dim={args.dim}  "
+            f"python={py * 1e3:8.2f} ms  numpy={vec * 1e3:8.2f} ms  "
+            f"speedup={py / vec:6.1f}x  max_abs_err={err:.2e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""
+Microbenchmarks for the RAG hot paths, offline and deterministic: chunking,
+pooling, snippet/grounding helpers, query expansion, dedup and RAGStore
+retrieval over synthetic corpora, with a stub embedding model
+(bench/stub_embeddings.py) so no model or network is needed.
+
+Run from backend/:
+    python -m bench.bench_rag run [--out results.json] [--sizes 1000,10000,100000] [--only retrieve]
+    python -m bench.bench_rag compare base.json new.json [--threshold 0.15]
+
+`run` prints a table and writes JSON (per case: median/p95/min/mean in
+microseconds). `compare` matches cases by name and exits 1 when any median
+got slower than the threshold allows, so it can gate CI.
+"""
+from __future__ import annotations
+
+import os
+
+# Benchmark the code path, not caches or background machinery (set before app imports)
+os.environ.setdefault("RAG_QUERY_CACHE_SIZE", "0")
+os.environ.setdefault("RAG_EMB_CACHE_PATH", "off")
+os.environ.setdefault("RAG_MICROBATCH", "0")
+os.environ.setdefault("RAG_RERANKER_MODEL", "disabled")
+
+import argparse
+import json
+import platform
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.api.v1.chat import Msg, _build_search_queries, _unique_snippets, validate_grounding
+from app.core.hf_embeddings import _mean_pool
+from app.core.rag import RAGStore, _chunk_long, _hybrid_chunk, _sentences, dedup_docs, new_index_dir
+from app.core.vectorstore import NumpyVectorStore
+
+from .stub_embeddings import StubEmbeddings
+
+Case = Tuple[str, Dict[str, Any], Callable[[], Any]]
+
+_WORDS = """
+python fastapi docker kubernetes aws azure gcp terraform postgres redis kafka spark pandas numpy pytorch
+tensorflow scikit model training inference pipeline dataset feature engineering deployment monitoring api
+service backend frontend react nextjs typescript javascript graphql rest microservice cloud serverless
+lambda function container cluster node scaling latency throughput cache index vector embedding search
+retrieval ranking transformer attention token sentence chunk document section project certification
+experience internship university engineering school degree course skill language framework library team
+lead built designed implemented improved reduced increased delivered automated migrated optimized tested
+summarizer youtube fraud detection credit card classifier chatbot portfolio resume dashboard analytics
+""".split()
+
+QUESTIONS = [
+    "What projects did he build?",
+    "List his certifications",
+    "Where did he study before engineering school?",
+    "What programming languages does he know?",
+    "Tell me about his professional experience",
+    "Which cloud platforms has he used?",
+    "What is the YouTube Video Summarizer?",
+    "credit card fraud detection model",
+]
+
+
+# -------------------------------
+# Synthetic inputs
+# -------------------------------
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(8, 22))]
+    return words[0].capitalize() + " " + " ".join(words[1:]) + "."
+
+
+def _paragraph(rng: random.Random, sentences: int) -> str:
+    return " ".join(_sentence(rng) for _ in range(sentences))
+
+
+def synthetic_doc(n_chars: int, seed: int = 0) -> str:
+    """Markdown with ## sections of a few paragraphs each, about n_chars long."""
+    rng = random.Random(seed)
+    parts: List[str] = []
+    size = 0
+    while size < n_chars:
+        title = " ".join(rng.choice(_WORDS) for _ in range(3)).title()
+        body = "\n\n".join(_paragraph(rng, rng.randint(3, 8)) for _ in range(rng.randint(1, 4)))
+        block = f"## {title}\n\n{body}\n"
+        parts.append(block)
+        size += len(block)
+    return "\n".join(parts)
+
+
+def synthetic_chunks(n: int, seed: int = 0, offset: int = 0) -> Tuple[List[str], List[Dict[str, Any]]]:
+    rng = random.Random(seed)
+    texts = [_paragraph(rng, rng.randint(2, 5)) for _ in range(n)]
+    metas = [{"source": f"doc{i % 50}.md", "section": f"S{i % 400}", "chunk_index": i} for i in range(offset, offset + n)]
+    return texts, metas
+
+
+# -------------------------------
+# Timing
+# -------------------------------
+
+def measure(fn: Callable[[], Any], min_time: float, max_iters: int, min_iters: int = 5) -> Dict[str, Any]:
+    """Per-call wall time (µs) over repeated calls: at least min_time seconds or min_iters calls."""
+    fn()  # warm-up (first-call allocations, lazy imports)
+    samples: List[float] = []
+    start = time.perf_counter()
+    while len(samples) < max_iters and (len(samples) < min_iters or time.perf_counter() - start < min_time):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1e6)
+    samples.sort()
+    return {
+        "iterations": len(samples),
+        "median_us": round(samples[len(samples) // 2], 2),
+        "p95_us": round(samples[min(len(samples) - 1, int(0.95 * len(samples)))], 2),
+        "min_us": round(samples[0], 2),
+        "mean_us": round(sum(samples) / len(samples), 2),
+    }
+
+
+# -------------------------------
+# Cases
+# -------------------------------
+
+def text_cases() -> Iterator[Case]:
+    for size in (10_000, 100_000, 1_000_000):
+        doc = synthetic_doc(size, seed=size)
+        yield f"chunk.hybrid_chunk[{size}]", {"chars": size}, lambda d=doc: _hybrid_chunk(d, filename="bench.md")
+    para = _paragraph(random.Random(1), 400)
+    yield "chunk.chunk_long[para]", {"chars": len(para)}, lambda: _chunk_long(para, target_chars=600, overlap=120)
+    yield "chunk.sentences[para]", {"chars": len(para)}, lambda: _sentences(para)
+
+    rng = np.random.default_rng(0)
+    for tokens, dim in ((128, 384), (512, 768)):
+        mat = rng.standard_normal((tokens, dim)).astype(np.float32).tolist()
+        yield f"hf.mean_pool[{tokens}x{dim}]", {"tokens": tokens, "dim": dim}, lambda m=mat: _mean_pool(m)
+
+    snippets = synthetic_chunks(64, seed=2)[0]
+    snippets = snippets + snippets[:16]  # repeats, as after multi-query retrieval
+    budget = sum(len(s) for s in snippets)  # no early stop on the char budget: every snippet is visited
+    yield "chat.unique_snippets[80]", {"snippets": len(snippets)}, lambda: _unique_snippets(snippets, max_chars=budget)
+
+    context = snippets[:12]
+    answer = " ".join(_sentence(random.Random(3)) for _ in range(12))
+    yield "chat.validate_grounding", {"context_docs": len(context)}, lambda: validate_grounding(answer, context, 0.2)
+
+    history = [
+        Msg(role="user", content="Tell me about Mohamed's projects"),
+        Msg(role="assistant", content="He built a YouTube Video Summarizer and a fraud detection model."),
+    ]
+    yield "chat.build_search_queries", {"questions": len(QUESTIONS)}, lambda: [_build_search_queries(q, history) for q in QUESTIONS]
+
+    texts, metas = synthetic_chunks(2000, seed=4)
+    docs = [Document(page_content=t, metadata=m) for t, m in zip(texts, metas)]
+    docs = docs + docs[::3]
+    yield f"rag.dedup_docs[{len(docs)}]", {"docs": len(docs)}, lambda: dedup_docs(docs)
+
+
+def build_store(n: int, dim: int, backend: str, root: str) -> RAGStore:
+    """
+    A RAGStore over n synthetic chunks, built into a new index version and published
+    as reindex does; vectors are written directly (no per-chunk embed calls).
+    """
+    os.environ["RAG_VECTOR_BACKEND"] = backend
+    emb = StubEmbeddings(dim)
+    store = RAGStore(persist_dir=os.path.join(root, f"{backend}-{n}"), embeddings=emb)
+    version_dir = new_index_dir(store.persist_dir)
+    vs = store._open_vs(version_dir)
+    parts: List[Tuple[List[str], List[str], List[Dict[str, Any]], np.ndarray]] = []
+    for start in range(0, n, 50_000):
+        texts, metas = synthetic_chunks(min(50_000, n - start), seed=start, offset=start)
+        ids = [f"c{start + i}" for i in range(len(texts))]
+        parts.append((ids, texts, metas, emb.embed_documents_array(texts)))
+        if backend != "numpy":
+            store._write_vectors(vs, *parts.pop())
+    if parts:
+        # One append: growing the numpy matrix batch by batch would copy it quadratically
+        store._write_vectors(
+            vs,
+            [i for p in parts for i in p[0]],
+            [t for p in parts for t in p[1]],
+            [m for p in parts for m in p[2]],
+            np.vstack([p[3] for p in parts]),
+        )
+    persist = getattr(vs, "persist", None)  # langchain_chroma's Chroma persists on write
+    if callable(persist):
+        persist()
+    store._publish(version_dir, vs)
+    # An unbuilt store serves from an empty in-memory NumpyVectorStore whatever the backend
+    if isinstance(store.vs, NumpyVectorStore) != (backend == "numpy") or store.index_dir != version_dir:
+        raise RuntimeError(f"{backend} bench store is a {type(store.vs).__name__} at {store.index_dir}")
+    return store
+
+
+def retrieval_cases(sizes: List[int], dim: int, backend: str, root: str) -> Iterator[Case]:
+    for n in sizes:
+        t0 = time.perf_counter()
+        store = build_store(n, dim, backend, root)
+        build_s = round(time.perf_counter() - t0, 2)
+        params = {"chunks": n, "dim": dim, "backend": backend, "build_seconds": build_s}
+        queries = [f"{q} {random.Random(i).choice(_WORDS)}" for i, q in enumerate(QUESTIONS)]
+        counter = iter(range(1 << 62))
+
+        def next_query() -> str:
+            return queries[next(counter) % len(queries)]
+
+        yield f"rag.retrieve[{n}]", params, lambda s=store: s.retrieve(next_query(), k=6)
+        yield f"rag.retrieve_mmr[{n}]", params, lambda s=store: s.retrieve_mmr(next_query(), k=8, fetch_k=96)
+        yield f"rag.retrieve_many[{n}]", params, lambda s=store: s.retrieve_many(queries[:6], k=8, fetch_k=96)
+        del store
+
+
+# -------------------------------
+# Run / compare
+# -------------------------------
+
+def _meta(args: argparse.Namespace) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5).stdout.strip()
+    except Exception:
+        commit = ""
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": commit or None,
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "sizes": args.sizes,
+        "dim": args.dim,
+        "backend": args.backend,
+        "min_time": args.min_time,
+    }
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    pattern = re.compile(args.only) if args.only else None
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    root = tempfile.mkdtemp(prefix="bench-rag-")
+    results: Dict[str, Any] = {}
+    try:
+        groups = [text_cases()]
+        retrieval_names = [f"rag.{m}[{n}]" for m in ("retrieve", "retrieve_mmr", "retrieve_many") for n in sizes]
+        if pattern is None or any(pattern.search(name) for name in retrieval_names):
+            groups.append(retrieval_cases(sizes, args.dim, args.backend, root))
+        for group in groups:
+            for name, params, fn in group:
+                if pattern is not None and not pattern.search(name):
+                    continue
+                row = {**params, **measure(fn, args.min_time, args.max_iters)}
+                results[name] = row
+                print(f"{name:36s} median {row['median_us']:>12.1f} µs   p95 {row['p95_us']:>12.1f} µs   n={row['iterations']}", flush=True)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    report = {"meta": _meta(args), "results": results}
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return report
+
+
+def compare(base_path: str, new_path: str, threshold: float) -> int:
+    base = json.loads(Path(base_path).read_text(encoding="utf-8"))["results"]
+    new = json.loads(Path(new_path).read_text(encoding="utf-8"))["results"]
+    regressions = 0
+    print(f"{'case':36s} {'base µs':>12s} {'new µs':>12s} {'ratio':>7s}")
+    for name in sorted(set(base) | set(new)):
+        if name not in base or name not in new:
+            print(f"{name:36s} {'(only in ' + ('new' if name in new else 'base') + ')':>33s}")
+            continue
+        b, n = base[name]["median_us"], new[name]["median_us"]
+        ratio = n / b if b else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif ratio < 1 / (1 + threshold):
+            flag = "  faster"
+        print(f"{name:36s} {b:>12.1f} {n:>12.1f} {ratio:>6.2f}x{flag}")
+    print(f"\n{regressions} regression(s) beyond {threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="RAG hot-path microbenchmarks")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("run", help="run the suite")
+    r.add_argument("--out", default=None, help="write JSON results here")
+    r.add_argument("--sizes", default="1000,10000,100000", help="corpus sizes for retrieval (e.g. add 1000000)")
+    r.add_argument("--dim", type=int, default=384)
+    r.add_argument("--backend", choices=["numpy", "chroma"], default="numpy")
+    r.add_argument("--only", default=None, help="regex on case names")
+    r.add_argument("--min-time", type=float, default=0.5, help="seconds per case")
+    r.add_argument("--max-iters", type=int, default=10_000)
+    c = sub.add_parser("compare", help="compare two result files")
+    c.add_argument("base")
+    c.add_argument("new")
+    c.add_argument("--threshold", type=float, default=0.15, help="allowed median slowdown (0.15 = 15%%)")
+    args = parser.parse_args()
+    if args.cmd == "compare":
+        sys.exit(compare(args.base, args.new, args.threshold))
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
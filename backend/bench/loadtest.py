@@ -0,0 +1,381 @@
+"""
+End-to-end load test of /api/v1/chat without OpenRouter or Hugging Face.
+
+Starts the stub LLM and embedding servers (bench/stub_servers.py), builds an
+index through the stub embeddings, launches the app with uvicorn (as in the
+dockerfile) pointed at the stubs via OPENROUTER_API_BASE / HF_API_URL_BASE, and
+drives traffic from a weighted question mix (standalone questions, paraphrases
+and follow-ups with history). For each load level it reports latency
+percentiles, throughput, in-flight requests and errors.
+
+Open loop (default): Poisson arrivals at each rate, independent of how fast the
+server answers, so queueing shows up in the tail instead of throttling the
+load. Closed loop (--concurrency): N clients back to back.
+
+Run from backend/:
+    python -m bench.loadtest --rates 1,2,5,10,20 --duration 30 [--workers 2] [--stream] [--out load.json]
+    python -m bench.loadtest --concurrency 1,4,16 --duration 30
+    python -m bench.loadtest --target http://127.0.0.1:8000 ...   # an app you started against the stubs
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from .stub_servers import StubConfig, start_hf_stub, start_openrouter_stub
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+# (weight, message, history) – roughly what the portfolio chat receives
+QUESTION_MIX: List[Tuple[int, str, List[Dict[str, str]]]] = [
+    (6, "What projects did he build?", []),
+    (4, "List his certifications", []),
+    (3, "What programming languages does he know?", []),
+    (3, "Tell me about his professional experience", []),
+    (2, "Where did he study before engineering school?", []),
+    (2, "Which cloud platforms has he used?", []),
+    (2, "What is the YouTube Video Summarizer?", []),
+    (2, "How can I contact him?", []),
+    (1, "what projects has he worked on", []),
+    (1, "which certificates does he hold?", []),
+    (1, "Does he have experience with machine learning in production?", []),
+    (1, "What did he do during his internship?", []),
+    (2, "Which technologies did he use for it?", [
+        {"role": "user", "content": "Tell me about the credit card fraud detection project"},
+        {"role": "assistant", "content": "He built a fraud detection model on imbalanced card transactions."},
+    ]),
+    (1, "And where was that?", [
+        {"role": "user", "content": "Where did he do his internship?"},
+        {"role": "assistant", "content": "He interned as a data science intern."},
+    ]),
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(sorted_vals: List[float], p: float) -> Optional[float]:
+    if not sorted_vals:
+        return None
+    idx = min(len(sorted_vals) - 1, max(0, int(round(p / 100.0 * len(sorted_vals) + 0.5)) - 1))
+    return round(sorted_vals[idx] * 1000, 1)
+
+
+class Sampler:
+    def __init__(self, seed: int):
+        self.rng = random.Random(seed)
+        self.population = [(m, h) for w, m, h in QUESTION_MIX for _ in range(w)]
+
+    def next(self) -> Dict[str, Any]:
+        message, history = self.rng.choice(self.population)
+        return {"message": message, "messages": history}
+
+
+# -------------------------------
+# App under test
+# -------------------------------
+
+class AppProcess:
+    """uvicorn serving app.main:app against the stubs, on a throwaway index."""
+    def __init__(self, env: Dict[str, str], workers: int, port: int, log_path: Optional[str] = None):
+        self.env = env
+        self.workers = workers
+        self.port = port
+        self.log_path = log_path
+        self.proc: Optional[subprocess.Popen] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def build_index(self) -> None:
+        # Built before the workers start, so every worker opens the same finished index
+        code = "from app.core.rag import RAGStore; RAGStore().reindex(full=True)"
+        out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=self.env, capture_output=True, text=True, timeout=600)
+        if out.returncode != 0:
+            raise RuntimeError("index build failed:\n" + out.stderr[-2000:])
+
+    def start(self, timeout: float = 300.0) -> None:
+        cmd = [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(self.port),
+            "--workers", str(self.workers), "--log-level", "warning",
+        ]
+        # App logs would drown the report; keep them in a file when asked for
+        log = open(self.log_path, "ab") if self.log_path else subprocess.DEVNULL
+        self.proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=self.env, stdout=log, stderr=subprocess.STDOUT)
+        deadline = time.monotonic() + timeout
+        ready = 0
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"app exited with {self.proc.returncode}")
+            try:
+                # Each worker warms up on its own; wait for several consecutive ready answers
+                ready = ready + 1 if httpx.get(self.url + "/readyz", timeout=2.0).status_code == 200 else 0
+                if ready >= 3 * self.workers:
+                    return
+            except httpx.HTTPError:
+                ready = 0
+            time.sleep(0.2)
+        raise RuntimeError("app did not become ready")
+
+    def stop(self) -> None:
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+
+# -------------------------------
+# Traffic
+# -------------------------------
+
+class Level:
+    """Results of one load level."""
+    def __init__(self) -> None:
+        self.latencies: List[float] = []
+        self.ttft: List[float] = []
+        self.errors: Dict[str, int] = {}
+        self.safe_answers = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._in_flight_area = 0.0
+        self._last_change = time.perf_counter()
+
+    def _track(self, delta: int) -> None:
+        now = time.perf_counter()
+        self._in_flight_area += self.in_flight * (now - self._last_change)
+        self._last_change = now
+        self.in_flight += delta
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def error(self, kind: str) -> None:
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def summary(self, elapsed: float, offered: Optional[float]) -> Dict[str, Any]:
+        lat = sorted(self.latencies)
+        ttft = sorted(self.ttft)
+        total = len(lat) + sum(self.errors.values())
+        return {
+            "offered_rps": offered,
+            "requests": total,
+            "ok": len(lat),
+            "throughput_rps": round(len(lat) / elapsed, 2) if elapsed else None,
+            "error_rate": round(sum(self.errors.values()) / total, 4) if total else 0.0,
+            "errors": dict(self.errors),
+            "safe_answers": self.safe_answers,
+            "latency_ms": {"p50": _percentile(lat, 50), "p95": _percentile(lat, 95), "p99": _percentile(lat, 99), "max": _percentile(lat, 100)},
+            "ttft_ms": {"p50": _percentile(ttft, 50), "p95": _percentile(ttft, 95), "p99": _percentile(ttft, 99)} if ttft else None,
+            "mean_in_flight": round(self._in_flight_area / elapsed, 2) if elapsed else None,
+            "max_in_flight": self.max_in_flight,
+            "seconds": round(elapsed, 2),
+        }
+
+
+async def _one(client: httpx.AsyncClient, url: str, body: Dict[str, Any], stream: bool, level: Level, safe_answer: str) -> None:
+    level._track(+1)
+    t0 = time.perf_counter()
+    try:
+        if stream:
+            first: Optional[float] = None
+            failed = None
+            async with client.stream("POST", url + "/api/v1/chat/stream", json=body) as resp:
+                if resp.status_code != 200:
+                    await resp.aread()
+                    failed = f"http_{resp.status_code}"
+                else:
+                    async for line in resp.aiter_lines():
+                        if line.startswith("event: token") and first is None:
+                            first = time.perf_counter() - t0
+                        elif line.startswith("event: error"):
+                            failed = "llm_error"
+                        elif line.startswith("event: retract"):
+                            level.safe_answers += 1
+            if failed:
+                level.error(failed)
+                return
+            if first is not None:
+                level.ttft.append(first)
+        else:
+            resp = await client.post(url + "/api/v1/chat", json=body)
+            if resp.status_code != 200:
+                level.error(f"http_{resp.status_code}")
+                return
+            if (resp.json() or {}).get("answer") == safe_answer:
+                level.safe_answers += 1
+        level.latencies.append(time.perf_counter() - t0)
+    except httpx.TimeoutException:
+        level.error("timeout")
+    except httpx.HTTPError as e:
+        level.error(type(e).__name__)
+    finally:
+        level._track(-1)
+
+
+async def open_loop(client: httpx.AsyncClient, url: str, rate: float, duration: float, sampler: Sampler, stream: bool, safe_answer: str) -> Dict[str, Any]:
+    level = Level()
+    tasks: List[asyncio.Task] = []
+    start = time.perf_counter()
+    next_at = 0.0
+    while True:
+        next_at += sampler.rng.expovariate(rate)
+        if next_at >= duration:
+            break
+        await asyncio.sleep(max(0.0, start + next_at - time.perf_counter()))
+        tasks.append(asyncio.create_task(_one(client, url, sampler.next(), stream, level, safe_answer)))
+    await asyncio.gather(*tasks)
+    return level.summary(time.perf_counter() - start, rate)
+
+
+async def closed_loop(client: httpx.AsyncClient, url: str, concurrency: int, duration: float, sampler: Sampler, stream: bool, safe_answer: str) -> Dict[str, Any]:
+    level = Level()
+    start = time.perf_counter()
+
+    async def user() -> None:
+        while time.perf_counter() - start < duration:
+            await _one(client, url, sampler.next(), stream, level, safe_answer)
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    summary = level.summary(time.perf_counter() - start, None)
+    summary["concurrency"] = concurrency
+    return summary
+
+
+async def drive(args: argparse.Namespace, url: str) -> List[Dict[str, Any]]:
+    from app.api.v1.chat import SAFE_ANSWER
+
+    sampler = Sampler(args.seed)
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    results: List[Dict[str, Any]] = []
+    async with httpx.AsyncClient(limits=limits, timeout=args.timeout) as client:
+        # A few sequential requests first: lazy loads and connection setup stay out of the first level
+        for _ in range(args.warmup):
+            await _one(client, url, sampler.next(), args.stream, Level(), SAFE_ANSWER)
+        if args.concurrency:
+            for n in [int(x) for x in args.concurrency.split(",")]:
+                row = await closed_loop(client, url, n, args.duration, sampler, args.stream, SAFE_ANSWER)
+                _print_row(f"c={n}", row)
+                results.append(row)
+        else:
+            for rate in [float(x) for x in args.rates.split(",")]:
+                row = await open_loop(client, url, rate, args.duration, sampler, args.stream, SAFE_ANSWER)
+                _print_row(f"{rate:g} rps", row)
+                results.append(row)
+    return results
+
+
+def _print_row(label: str, row: Dict[str, Any]) -> None:
+    lat = row["latency_ms"]
+    print(
+        f"{label:>10s}  ok={row['ok']:<6d} thr={row['throughput_rps'] or 0:>7.2f}/s  "
+        f"p50={lat['p50'] or 0:>8.1f}  p95={lat['p95'] or 0:>8.1f}  p99={lat['p99'] or 0:>8.1f} ms  "
+        f"err={row['error_rate']:.2%}  inflight~{row['mean_in_flight']} (max {row['max_in_flight']})",
+        flush=True,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test /api/v1/chat against local stub LLM/embedding servers")
+    parser.add_argument("--rates", default="1,2,5,10", help="open-loop arrival rates (req/s)")
+    parser.add_argument("--concurrency", default=None, help="closed-loop client counts instead of rates, e.g. 1,4,16")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per level")
+    parser.add_argument("--stream", action="store_true", help="use /chat/stream (also reports time to first token)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--target", default=None, help="existing app URL (skips starting stubs and the app)")
+    parser.add_argument("--with-cache", action="store_true", help="keep the chat response caches on (off by default)")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--max-connections", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="write JSON results here")
+    parser.add_argument("--app-log", default=None, help="append the app's output to this file")
+    stub = parser.add_argument_group("stub servers")
+    stub.add_argument("--llm-latency-ms", type=float, default=800.0, help="median time to the LLM response/first token")
+    stub.add_argument("--llm-latency-sigma", type=float, default=0.3, help="lognormal spread of the LLM latency")
+    stub.add_argument("--token-delay-ms", type=float, default=15.0, help="delay between streamed tokens")
+    stub.add_argument("--llm-error-rate", type=float, default=0.0)
+    stub.add_argument("--llm-429-rate", type=float, default=0.0)
+    stub.add_argument("--llm-refusal-rate", type=float, default=0.0)
+    stub.add_argument("--hf-latency-ms", type=float, default=30.0)
+    stub.add_argument("--hf-error-rate", type=float, default=0.0)
+    stub.add_argument("--hf-feature-extraction", action="store_true", help="refuse /embeddings so the app pools token vectors")
+    args = parser.parse_args()
+
+    config: Dict[str, Any] = {k: v for k, v in vars(args).items() if k not in {"out", "app_log"}}
+    servers: List[Any] = []
+    app: Optional[AppProcess] = None
+    data_dir = tempfile.mkdtemp(prefix="loadtest-")
+    try:
+        if args.target:
+            url = args.target.rstrip("/")
+        else:
+            llm = start_openrouter_stub(StubConfig(
+                latency_ms=args.llm_latency_ms,
+                latency_sigma=args.llm_latency_sigma,
+                token_delay_ms=args.token_delay_ms,
+                error_rate=args.llm_error_rate,
+                rate_limit_rate=args.llm_429_rate,
+                refusal_rate=args.llm_refusal_rate,
+                seed=args.seed,
+            ))
+            hf = start_hf_stub(StubConfig(
+                latency_ms=args.hf_latency_ms,
+                error_rate=args.hf_error_rate,
+                feature_extraction_only=args.hf_feature_extraction,
+                seed=args.seed + 1,
+            ))
+            servers = [llm, hf]
+            env = {
+                **os.environ,
+                "OPENROUTER_API_BASE": llm.url,
+                "OPENROUTER_API_KEY": "stub",
+                "HF_API_URL_BASE": hf.url,
+                "HUGGINGFACE_API_KEY": "stub",
+                "CHROMA_DB_PATH": os.path.join(data_dir, "index"),
+                "RAG_EMB_CACHE_PATH": os.path.join(data_dir, "embedding_cache.sqlite3"),
+                "RAG_RERANKER_MODEL": os.getenv("RAG_RERANKER_MODEL", "disabled"),
+                "RAG_WATCH_DOCS": "0",
+            }
+            if not args.with_cache:
+                env.update({"CHAT_CACHE_SIZE": "0", "CHAT_SEMANTIC_CACHE_SIZE": "0"})
+            app = AppProcess(env, args.workers, _free_port(), args.app_log)
+            print(f"stubs: llm={llm.url} hf={hf.url}; building index ...", flush=True)
+            app.build_index()
+            app.start()
+            url = app.url
+            print(f"app: {url} ({args.workers} worker(s))", flush=True)
+
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+        results = asyncio.run(drive(args, url))
+        report = {"config": config, "levels": results}
+        if args.out:
+            Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    finally:
+        if app is not None:
+            app.stop()
+        for server in servers:
+            server.stop()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Deterministic, model-free embeddings for offline benchmarks and load tests.
+
+Feature hashing of word tokens (crc32, stable across processes) into `dim`
+signed buckets, L2-normalized. Texts sharing words get similar vectors, so
+search results are meaningful, and encoding costs microseconds.
+"""
+from __future__ import annotations
+
+import re
+import zlib
+from typing import List
+
+import numpy as np
+
+_TOKEN = re.compile(r"\w+")
+
+
+class StubEmbeddings:
+    def __init__(self, dim: int = 384):
+        self.dim = int(dim)
+        self.model_name = f"stub-hash-{self.dim}"
+        self.doc_prefix = ""
+        self.query_prefix = ""
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for tok in _TOKEN.findall((text or "").lower()):
+                h = zlib.crc32(tok.encode("utf-8"))
+                out[i, h % self.dim] += 1.0 if (h >> 16) & 1 else -1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+    def embed_documents_array(self, texts: List[str]) -> np.ndarray:
+        return self._encode(texts)
+
+    def embed_queries_array(self, texts: List[str]) -> np.ndarray:
+        return self._encode(texts)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts).tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
@@ -0,0 +1,232 @@
+"""
+Local stand-ins for the external APIs the chat path calls, for load tests:
+
+  - OpenRouter: POST {base}/chat/completions, JSON or SSE streaming (stream=true).
+    Answers are built from words of the prompt's context, so they pass the
+    grounding check like a well-behaved model would.
+  - HF Inference: POST {base}/embeddings/<model> and
+    {base}/pipeline/feature-extraction/<model>, with deterministic vectors from
+    bench/stub_embeddings.py.
+
+Latency (lognormal around a median), per-token streaming delay, refusals and
+error rates are configurable. Standalone, for pointing a dev server at them:
+
+    python -m bench.stub_servers [--llm-port 8901] [--hf-port 8902] [--llm-latency-ms 800]
+    OPENROUTER_API_BASE=http://127.0.0.1:8901 HF_API_URL_BASE=http://127.0.0.1:8902 uvicorn app.main:app
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from .stub_embeddings import StubEmbeddings
+
+_WORD = re.compile(r"[A-Za-z][A-Za-z0-9\-]{3,}")
+REFUSAL = "I don't know based on the provided context."
+
+
+class StubConfig:
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        latency_sigma: float = 0.3,
+        token_delay_ms: float = 0.0,
+        answer_words: int = 40,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        refusal_rate: float = 0.0,
+        dim: int = 384,
+        feature_extraction_only: bool = False,
+        seed: Optional[int] = None,
+    ):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.token_delay_ms = token_delay_ms
+        self.answer_words = answer_words
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.refusal_rate = refusal_rate
+        self.dim = dim
+        self.feature_extraction_only = feature_extraction_only
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self) -> float:
+        with self._lock:
+            return self.rng.random()
+
+    def delay(self) -> None:
+        if self.latency_ms <= 0:
+            return
+        with self._lock:
+            factor = self.rng.lognormvariate(0.0, self.latency_sigma) if self.latency_sigma > 0 else 1.0
+        time.sleep(self.latency_ms * factor / 1000.0)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+    config: StubConfig
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        pass
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return {}
+
+    def _send_json(self, status: int, body: Any) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _injected_error(self) -> bool:
+        roll = self.config.draw()
+        if roll < self.config.error_rate:
+            self._send_json(500, {"error": "stub: injected server error"})
+            return True
+        if roll < self.config.error_rate + self.config.rate_limit_rate:
+            self._send_json(429, {"error": "stub: rate limited", "estimated_time": 0.0})
+            return True
+        return False
+
+
+class OpenRouterStubHandler(_Handler):
+    def do_POST(self) -> None:
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": "not found"})
+            return
+        payload = self._read_json()
+        self.config.delay()
+        if self._injected_error():
+            return
+        answer = self._answer(payload.get("messages") or [])
+        if payload.get("stream"):
+            self._stream(answer)
+        else:
+            self._send_json(200, {
+                "id": "stub-completion",
+                "model": payload.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+            })
+
+    def _answer(self, messages: List[Dict[str, Any]]) -> str:
+        if self.config.draw() < self.config.refusal_rate:
+            return REFUSAL
+        # Words from the prompt (system context + question), so the grounding check passes
+        text = " ".join(str(m.get("content") or "") for m in messages if m.get("role") != "assistant")
+        words = list(dict.fromkeys(_WORD.findall(text)))[: self.config.answer_words]
+        return ("Based on the documents: " + " ".join(words) + ".") if words else REFUSAL
+
+    def _stream(self, answer: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def chunk(data: str) -> None:
+            raw = data.encode("utf-8")
+            self.wfile.write(f"{len(raw):x}\r\n".encode("ascii") + raw + b"\r\n")
+            self.wfile.flush()
+
+        chunk(": OPENROUTER PROCESSING\n\n")
+        for tok in re.findall(r"\S+\s*", answer):
+            if self.config.token_delay_ms > 0:
+                time.sleep(self.config.token_delay_ms / 1000.0)
+            chunk("data: " + json.dumps({"choices": [{"index": 0, "delta": {"content": tok}}]}) + "\n\n")
+        chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class HFStubHandler(_Handler):
+    embeddings: StubEmbeddings
+
+    def do_POST(self) -> None:
+        payload = self._read_json()
+        inputs = payload.get("inputs") or []
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        if "/embeddings/" in self.path:
+            if self.config.feature_extraction_only:
+                self._send_json(403, {"error": "stub: embeddings endpoint disabled"})
+                return
+            self.config.delay()
+            if self._injected_error():
+                return
+            self._send_json(200, self.embeddings.embed_documents(inputs))
+        elif "/pipeline/feature-extraction/" in self.path:
+            self.config.delay()
+            if self._injected_error():
+                return
+            # Per-token rows, as the real pipeline returns; every row is the sentence vector, so pooling is exact
+            vecs = self.embeddings.embed_documents(inputs)
+            self._send_json(200, [[v] * max(1, min(32, len(t.split()))) for v, t in zip(vecs, inputs)])
+        else:
+            self._send_json(404, {"error": "not found"})
+
+
+class StubServer:
+    """A handler class served on 127.0.0.1 from a daemon thread."""
+    def __init__(self, handler: type, config: StubConfig, port: int = 0, **attrs: Any):
+        handler_cls = type(handler.__name__, (handler,), {"config": config, **attrs})
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), handler_cls)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name=handler.__name__, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubServer":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def start_openrouter_stub(config: StubConfig, port: int = 0) -> StubServer:
+    return StubServer(OpenRouterStubHandler, config, port).start()
+
+
+def start_hf_stub(config: StubConfig, port: int = 0) -> StubServer:
+    return StubServer(HFStubHandler, config, port, embeddings=StubEmbeddings(config.dim)).start()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stub OpenRouter and HF Inference servers")
+    parser.add_argument("--llm-port", type=int, default=8901)
+    parser.add_argument("--hf-port", type=int, default=8902)
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--token-delay-ms", type=float, default=20.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--hf-latency-ms", type=float, default=30.0)
+    parser.add_argument("--hf-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    llm = start_openrouter_stub(StubConfig(args.llm_latency_ms, token_delay_ms=args.token_delay_ms, error_rate=args.llm_error_rate), args.llm_port)
+    hf = start_hf_stub(StubConfig(args.hf_latency_ms, error_rate=args.hf_error_rate), args.hf_port)
+    print(f"OPENROUTER_API_BASE={llm.url}\nHF_API_URL_BASE={hf.url}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        llm.stop()
+        hf.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -46,27 +46,64 @@ export default function ChatBot() {
         content: m.text,
       }))
 
-      const res = await fetch(`${API_BASE}/api/v1/chat`, {
+      const res = await fetch(`${API_BASE}/api/v1/chat/stream`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
         body: JSON.stringify({ message: text, top_k: 6, messages: history })
       })
 
-      if (!res.ok) {
+      if (!res.ok || !res.body) {
         // Friendly error message on server-side failure
         throw new Error(`HTTP ${res.status}`)
       }
 
-      const data = await res.json()
-      const answer = data?.answer ?? 'No answer.'
-      const botMessage = {
-        id: (Date.now() + 1).toString(),
-        text: answer,
-        isBot: true,
-        timestamp: new Date(),
-        welcome: false,
+      // Stream tokens into a bot message as server-sent events arrive
+      const botId = (Date.now() + 1).toString()
+      let answer = ''
+      let started = false
+      const setBotText = (value: string) => {
+        if (!started) {
+          started = true
+          setIsTyping(false)
+          setMessages(prev => [...prev, { id: botId, text: value, isBot: true, timestamp: new Date(), welcome: false }])
+        } else {
+          setMessages(prev => prev.map(m => (m.id === botId ? { ...m, text: value } : m)))
+        }
+      }
+
+      const reader = res.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ''
+      let failed = false
+      while (true) {
+        const { value, done } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+        const events = buffer.split('\n\n')
+        buffer = events.pop() ?? ''
+        for (const raw of events) {
+          const event = raw.match(/^event: (.*)$/m)?.[1]
+          const data = raw.match(/^data: (.*)$/m)?.[1]
+          if (!event || !data) continue
+          const payload = JSON.parse(data)
+          if (event === 'token') {
+            answer += payload.text
+            setBotText(answer)
+          } else if (event === 'retract' || event === 'done') {
+            answer = payload.answer ?? answer
+            setBotText(answer || 'No answer.')
+          } else if (event === 'error') {
+            failed = true
+          }
+        }
+      }
+
+      if (failed) {
+        if (!started) throw new Error('LLM error')
+        setBotText('The AI assistant is not available at the moment. Please try again later.')
+      } else if (!started) {
+        setBotText('No answer.')
       }
-      setMessages(prev => [...prev, botMessage])
     } catch (err) {
       // Show user-friendly message instead of raw error
       const botMessage = {